@@ -0,0 +1,45 @@
+# Compares data packet dispatch throughput between the default "task" dispatch mode and the
+# "inline" dispatch mode of the Listener, without a TCI server.  Packets are fed straight into
+# the listener receive loop from memory so only parsing and dispatch are measured.
+#
+#   python dispatch_benchmark.py [packet_count] [callback_count]
+
+from eesdr_tci.listener import Listener
+from eesdr_tci.tci import TciDataPacket, TciSampleType, TciStreamType
+from memory_socket import MemorySocket, make_frames
+import asyncio
+import sys
+import time
+
+async def run(dispatch, zero_copy, frames, callback_count):
+    tci_listener = Listener("ws://localhost:50001", dispatch=dispatch, zero_copy=zero_copy)
+    received = 0
+
+    async def on_packet(packet):
+        nonlocal received
+        received += 1
+
+    callbacks = [lambda packet: on_packet(packet) for _ in range(callback_count)]
+    for callback in callbacks:
+        tci_listener.add_data_listener(TciStreamType.IQ_STREAM, callback)
+
+    expected = len(frames) * callback_count
+    start = time.perf_counter()
+    try:
+        await tci_listener._listen_main(MemorySocket(frames))
+    except EOFError:
+        pass
+    while received < expected:
+        await asyncio.sleep(0)
+    return len(frames) / (time.perf_counter() - start)
+
+packet_count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+callback_count = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+frames = make_frames(packet_count)
+
+print(f"{packet_count} packets, {callback_count} callbacks per packet")
+for dispatch in Listener.DISPATCH_MODES:
+    for zero_copy in (False, True):
+        rate = asyncio.run(run(dispatch, zero_copy, frames, callback_count))
+        copy_desc = "zero-copy" if zero_copy else "copy"
+        print(f"{dispatch.ljust(8)} {copy_desc.ljust(10)} {rate:12.0f} packets/sec")
@@ -0,0 +1,34 @@
+# Stand-in for a WebSocket connection shared by the benchmarks, feeding frames from memory straight
+# into a listener receive loop, and the IQ data frames the benchmarks feed it.
+
+from eesdr_tci.tci import TciDataPacket, TciSampleType, TciStreamType
+import asyncio
+import time
+
+def make_frames(count, samples=2048):
+    packet = TciDataPacket(0, 384000, TciSampleType.INT16, 0, 0, samples, TciStreamType.IQ_STREAM, 2, bytes(2*samples))
+    frame = packet.to_bytes()
+    return [frame] * count
+
+class MemorySocket:
+    # With yield_each, recv() yields to the event loop before each frame as a real socket would.  With
+    # a rate, frames are also delivered no faster than rate frames per second, as from a radio.
+    def __init__(self, frames, yield_each=False, rate=0):
+        self._frames = iter(frames)
+        self._yield_each = yield_each
+        self._interval = 1 / rate if rate else 0
+        self._next = None
+
+    async def recv(self):
+        if self._interval:
+            now = time.perf_counter()
+            if self._next is None:
+                self._next = now
+            await asyncio.sleep(max(0, self._next - now))
+            self._next += self._interval
+        elif self._yield_each:
+            await asyncio.sleep(0)
+        try:
+            return next(self._frames)
+        except StopIteration:
+            raise EOFError() from None
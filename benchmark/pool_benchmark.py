@@ -0,0 +1,58 @@
+# Measures the aggregate data packet throughput of a ListenerPool as the number of radios grows,
+# all driven from one event loop in one process, without TCI servers.  Each radio delivers packets
+# from memory at a fixed rate, as a real radio streams IQ data, and they are consumed through a
+# merged stream tagged by radio.  Aggregate throughput grows with the radio count while the event
+# loop keeps up; the CPU load column shows how much of one core the pool uses, and where it
+# saturates the aggregate stops growing and the per-radio rate falls below the target.
+#
+#   python pool_benchmark.py [packets_per_sec_per_radio] [seconds] [max_radios]
+
+from eesdr_tci.pool import ListenerPool
+from eesdr_tci.tci import TciStreamType
+from memory_socket import MemorySocket, make_frames
+import asyncio
+import sys
+import time
+
+async def feed(listener, frames, rate):
+    try:
+        await listener._listen_main(MemorySocket(frames, yield_each=True, rate=rate))
+    except EOFError:
+        pass
+
+async def run(radio_count, frames, rate):
+    pool = ListenerPool([f"ws://radio{i}:50001" for i in range(radio_count)], dispatch="inline", zero_copy=True)
+    stream = pool.stream(TciStreamType.IQ_STREAM, maxsize=256, overflow="block")
+    per_radio = {radio: 0 for radio in pool}
+    expected = len(frames) * radio_count
+
+    async def consume():
+        received = 0
+        async for radio, packet in stream:
+            per_radio[radio] += 1
+            received += 1
+            if received == expected:
+                break
+
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    await asyncio.gather(consume(), *(feed(listener, frames, rate) for listener in pool.listeners.values()))
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - cpu_start
+    stream.close()
+    pool.shutdown()
+    assert all(count == len(frames) for count in per_radio.values())
+    return expected / elapsed, cpu / elapsed
+
+rate = float(sys.argv[1]) if len(sys.argv) > 1 else 2000
+seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 2.0
+max_radios = int(sys.argv[3]) if len(sys.argv) > 3 else 32
+frames = make_frames(int(rate * seconds))
+
+print(f"{rate:.0f} packets/sec per radio for {seconds} sec")
+radio_count = 1
+while radio_count <= max_radios:
+    total, load = asyncio.run(run(radio_count, frames, rate))
+    print(f"{radio_count:3d} radios {total:12.0f} packets/sec total {total / radio_count:12.0f} packets/sec per radio"
+          f" {100 * load:5.0f}% CPU")
+    radio_count *= 2
@@ -0,0 +1,81 @@
+# Minimal TCI server used by the benchmarks in place of a radio.  It sends a short initial state and
+# READY one command per frame, as every release of the listener accepts, echoes writes, answers
+# reads of parameters it has seen, and streams IQ packets as fast as the connection accepts them
+# between iq_start and iq_stop.
+
+from eesdr_tci.tci import TciDataPacket, TciSampleType, TciStreamType
+import asyncio
+import websockets
+
+INITIAL_STATE = ("protocol:ExpertSDR3,1.9;", "device:SunSDR2DX;", "receive_only:false;", "trx_count:2;",
+                 "channels_count:2;", "vfo:0,0,7074000;", "vfo:0,1,7075000;", "dds:0,7000000;",
+                 "modulation:0,usb;", "trx:0,false;", "iq_samplerate:48000;")
+
+class StandInServer:
+    def __init__(self, port, iq_samplerate=384000, iq_samples=2048):
+        self.port = port
+        self.iq_samplerate = iq_samplerate
+        self.iq_samples = iq_samples
+        self.state = {}
+        self._server = None
+
+    async def start(self):
+        self._server = await websockets.serve(self._serve, "127.0.0.1", self.port)
+
+    def close(self):
+        self._server.close()
+
+    def _iq_frame(self, rx):
+        samples = 2 * self.iq_samples
+        packet = TciDataPacket(rx, self.iq_samplerate, TciSampleType.INT16, 0, 0, samples,
+                               TciStreamType.IQ_STREAM, 2, bytes(2 * samples))
+        return packet.to_bytes()
+
+    async def _stream(self, ws, rx):
+        frame = self._iq_frame(rx)
+        while True:
+            await ws.send(frame)
+            await asyncio.sleep(0)
+
+    async def _serve(self, ws, *_):
+        for command in INITIAL_STATE:
+            self._remember(command.rstrip(";"))
+            await ws.send(command)
+        await ws.send("ready;")
+        streams = {}
+        try:
+            async for message in ws:
+                if isinstance(message, bytes):
+                    continue
+                for command in message.split(";"):
+                    if command:
+                        await self._command(ws, command, streams)
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            for task in streams.values():
+                task.cancel()
+
+    def _remember(self, command):
+        name, _, params = command.partition(":")
+        fields = params.split(",") if params else [""]
+        # Parameters written with one value after the receiver and sub-receiver numbers, if any.
+        self.state[(name.lower(), tuple(fields[:-1]))] = command
+
+    async def _command(self, ws, command, streams):
+        name, _, params = command.partition(":")
+        name = name.lower()
+        if name == "iq_start":
+            if params not in streams:
+                streams[params] = asyncio.create_task(self._stream(ws, int(params or 0)))
+        elif name == "iq_stop":
+            task = streams.pop(params, None)
+            if task is not None:
+                task.cancel()
+        else:
+            known = self.state.get((name, tuple(params.split(",")) if params else ()))
+            if known is not None:
+                await ws.send(known + ";")
+                return
+            self._remember(command)
+        await ws.send(command + ";")
@@ -0,0 +1,299 @@
+# Runs the performance benchmarks of the package and prints the results as JSON, so runs of
+# different versions can be compared.  Covers command parsing in the listener receive loop per
+# command class, data packet decoding and encoding for every sample type, command string
+# preparation, dispatch to N callbacks, and end-to-end throughput and request latency over a
+# loopback WebSocket connection to a local stand-in server.  Cases using features missing from the
+# installed version are reported as skipped, so the same script also runs against older releases;
+# any other error fails the run.
+#
+#   python suite.py [--quick] [--output results.json] [--compare baseline.json]
+
+from eesdr_tci import tci
+from eesdr_tci.listener import Listener
+from eesdr_tci.tci import TciCommandSendAction, TciDataPacket, TciSampleType, TciStreamType
+from memory_socket import MemorySocket
+from stand_in_server import StandInServer
+import argparse
+import asyncio
+import inspect
+import json
+import platform
+import statistics
+import sys
+import time
+
+try:
+    from importlib.metadata import version as package_version
+    PACKAGE_VERSION = package_version("eesdr-tci")
+except Exception:
+    PACKAGE_VERSION = None
+
+BYTES_PER_SAMPLE = {TciSampleType.INT16: 2, TciSampleType.INT24: 3, TciSampleType.INT32: 4, TciSampleType.FLOAT32: 4}
+
+COMMAND_CLASSES = {
+    "system_int": "volume:-6;",
+    "rx_int": "dds:0,7000000;",
+    "rx_sub_rx_int": "vfo:0,0,7074000;",
+    "rx_string": "modulation:0,usb;",
+    "rx_bool": "trx:0,false;",
+    "rx_multi_float": "tx_sensors:0,-10.5,-20.1,1.2,3.4;",
+    "variadic_string": "modulations_list:AM,SAM,DSB,LSB,USB,CW,NFM,DIGL,DIGU,WFM,DRM;",
+    "batch_of_8": "dds:0,7000000;vfo:0,0,7074000;vfo:0,1,7075000;if:0,0,0;modulation:0,usb;rx_mute:0,false;drive:0,50;volume:-6;",
+}
+
+PREPARE_CASES = {
+    "read_rx_sub_rx": ("VFO", TciCommandSendAction.READ, 0, 0, ()),
+    "write_rx_sub_rx": ("VFO", TciCommandSendAction.WRITE, 0, 0, (7074000,)),
+    "write_system": ("VOLUME", TciCommandSendAction.WRITE, None, None, (-6,)),
+    "write_multi": ("SPOT", TciCommandSendAction.WRITE, None, None, ("K1ABC", "USB", 14074000, 0xFF0000, "FT8")),
+}
+
+class Skipped(Exception):
+    pass
+
+def supports(func, param):
+    return param in inspect.signature(func).parameters
+
+def require(condition, feature):
+    if not condition:
+        raise Skipped(f"{feature} not available")
+
+def run_case(func, *args):
+    try:
+        return func(*args)
+    except Skipped as exc:
+        return {"skipped": str(exc)}
+
+def timed_loop(func, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        func()
+    return time.perf_counter() - start
+
+def rate_result(count, elapsed, unit):
+    return {f"{unit}_per_sec": count / elapsed, "usec_per_op": 1e6 * elapsed / count}
+
+async def listen(listener, frames):
+    try:
+        await listener._listen_main(MemorySocket(frames))
+    except EOFError:
+        pass
+
+def parse_listener():
+    # Inline dispatch keeps task creation out of the parse timings where it is available.
+    if supports(Listener, "dispatch"):
+        tci_listener = Listener("ws://localhost:50001", dispatch="inline")
+    else:
+        tci_listener = Listener("ws://localhost:50001")
+    tci_listener._ready_event = asyncio.Event()
+    return tci_listener
+
+async def noop(*args):
+    pass
+
+def accepts_batches():
+    # Older releases expect exactly one command per frame.
+    tci_listener = parse_listener()
+    received = []
+
+    async def on_volume(name, rx, sub_rx, params):
+        received.append(params)
+
+    async def run():
+        tci_listener.add_param_listener("VOLUME", on_volume)
+        try:
+            await listen(tci_listener, ["volume:-6;volume:-5;"])
+        except ValueError:
+            return
+        await asyncio.sleep(0)
+
+    asyncio.run(run())
+    return received == [-6, -5]
+
+def parse_case(frame, count):
+    if frame.count(";") > 1:
+        require(accepts_batches(), "multiple commands per frame")
+    tci_listener = parse_listener()
+    tci_listener.add_param_listener("*", noop)
+    commands = frame.count(";")
+    start = time.perf_counter()
+    asyncio.run(listen(tci_listener, [frame] * count))
+    return rate_result(count * commands, time.perf_counter() - start, "commands")
+
+def bench_parse(count):
+    return {name: run_case(parse_case, frame, count) for name, frame in COMMAND_CLASSES.items()}
+
+def packet_frame(sample_type, samples):
+    data = bytes(BYTES_PER_SAMPLE[sample_type] * 2 * samples)
+    packet = TciDataPacket(0, 48000, sample_type, 0, 0, 2 * samples, TciStreamType.RX_AUDIO_STREAM, 2, data)
+    return packet, packet.to_bytes()
+
+def to_bytes_case(sample_type, count, samples):
+    packet, _ = packet_frame(sample_type, samples)
+    return rate_result(count, timed_loop(packet.to_bytes, count), "packets")
+
+def from_buf_case(sample_type, count, samples, zero_copy):
+    _, frame = packet_frame(sample_type, samples)
+    if zero_copy:
+        require(supports(TciDataPacket.from_buf, "zero_copy"), "zero_copy decoding")
+        return rate_result(count, timed_loop(lambda: TciDataPacket.from_buf(frame, True), count), "packets")
+    return rate_result(count, timed_loop(lambda: TciDataPacket.from_buf(frame), count), "packets")
+
+def bench_packets(count, samples=2048):
+    results = {}
+    for sample_type in TciSampleType:
+        name = sample_type.name.lower()
+        results[f"to_bytes_{name}"] = run_case(to_bytes_case, sample_type, count, samples)
+        results[f"from_buf_{name}"] = run_case(from_buf_case, sample_type, count, samples, False)
+        results[f"from_buf_zero_copy_{name}"] = run_case(from_buf_case, sample_type, count, samples, True)
+    return results
+
+def prepare_case(command, action, rx, sub_rx, params, count):
+    cmd_info = tci.COMMANDS[command]
+    elapsed = timed_loop(lambda: cmd_info.prepare_string(action, rx, sub_rx, params), count)
+    return rate_result(count, elapsed, "commands")
+
+def bench_prepare(count):
+    return {name: run_case(prepare_case, *case, count) for name, case in PREPARE_CASES.items()}
+
+def dispatch_case(dispatch, callback_count, count):
+    packet = TciDataPacket(0, 384000, TciSampleType.INT16, 0, 0, 4096, TciStreamType.IQ_STREAM, 2, bytes(8192))
+    frames = [packet.to_bytes()] * count
+
+    async def run():
+        if dispatch == "task" and not supports(Listener, "dispatch"):
+            tci_listener = Listener("ws://localhost:50001")
+        else:
+            require(dispatch in getattr(Listener, "DISPATCH_MODES", ()), f'{dispatch} dispatch')
+            tci_listener = Listener("ws://localhost:50001", dispatch=dispatch)
+        received = 0
+
+        async def on_packet(packet):
+            nonlocal received
+            received += 1
+
+        for _ in range(callback_count):
+            tci_listener.add_data_listener(TciStreamType.IQ_STREAM, lambda packet: on_packet(packet))
+        start = time.perf_counter()
+        await listen(tci_listener, frames)
+        while received < count * callback_count:
+            await asyncio.sleep(0)
+        return time.perf_counter() - start
+
+    return rate_result(count, asyncio.run(run()), "packets")
+
+def bench_dispatch(count, callback_counts=(1, 4, 16)):
+    results = {}
+    for dispatch in ("task", "inline"):
+        for callback_count in callback_counts:
+            results[f"{dispatch}_{callback_count}_callbacks"] = run_case(dispatch_case, dispatch, callback_count, count)
+    return results
+
+def end_to_end_case(duration, requests, port):
+    async def run():
+        server = StandInServer(port)
+        await server.start()
+        if supports(Listener, "zero_copy"):
+            tci_listener = Listener(f"ws://127.0.0.1:{port}", zero_copy=True)
+        else:
+            tci_listener = Listener(f"ws://127.0.0.1:{port}")
+        try:
+            start = time.perf_counter()
+            await tci_listener.start()
+            await tci_listener.ready()
+            connect_time = time.perf_counter() - start
+
+            acknowledged = None
+
+            async def on_vfo(name, rx, sub_rx, params):
+                if acknowledged is not None and not acknowledged.done():
+                    acknowledged.set_result(params)
+
+            tci_listener.add_param_listener("VFO", on_vfo)
+            latencies = []
+            for i in range(requests):
+                acknowledged = asyncio.get_running_loop().create_future()
+                start = time.perf_counter()
+                await tci_listener.send(f"vfo:0,0,{7074000 + i};")
+                await acknowledged
+                latencies.append(time.perf_counter() - start)
+
+            received = 0
+            received_bytes = 0
+
+            async def on_packet(packet):
+                nonlocal received, received_bytes
+                received += 1
+                received_bytes += packet.length
+
+            tci_listener.add_data_listener(TciStreamType.IQ_STREAM, on_packet)
+            await tci_listener.send("iq_start:0;")
+            await asyncio.sleep(duration / 4)
+            start_count = received
+            start_bytes = received_bytes
+            start = time.perf_counter()
+            await asyncio.sleep(duration)
+            elapsed = time.perf_counter() - start
+        finally:
+            tci_listener.shutdown()
+            server.close()
+
+        latencies.sort()
+        return {
+            "connect_to_ready_ms": 1e3 * connect_time,
+            "iq_frames_per_sec": (received - start_count) / elapsed,
+            "iq_samples_per_sec": (received_bytes - start_bytes) / elapsed,
+            "request_latency_ms_mean": 1e3 * statistics.mean(latencies),
+            "request_latency_ms_p50": 1e3 * latencies[len(latencies) // 2],
+            "request_latency_ms_p99": 1e3 * latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))],
+        }
+
+    return asyncio.run(run())
+
+def bench_end_to_end(duration, requests, port):
+    return {"loopback": run_case(end_to_end_case, duration, requests, port)}
+
+def compare(results, baseline):
+    for group, metrics in results["results"].items():
+        for name, values in metrics.items():
+            base = baseline.get("results", {}).get(group, {}).get(name)
+            if base is None:
+                continue
+            if isinstance(values, dict):
+                for key, value in values.items():
+                    if isinstance(value, (int, float)) and isinstance(base.get(key), (int, float)) and base[key]:
+                        print(f"{group}.{name}.{key}: {value / base[key]:.2f}x baseline", file=sys.stderr)
+            elif isinstance(values, (int, float)) and isinstance(base, (int, float)) and base:
+                print(f"{group}.{name}: {values / base:.2f}x baseline", file=sys.stderr)
+
+parser = argparse.ArgumentParser(description="Runs the eesdr-tci benchmark suite and prints JSON results.")
+parser.add_argument("--quick", action="store_true", help="run fewer iterations")
+parser.add_argument("--output", help="also write the results to this file")
+parser.add_argument("--compare", help="print ratios against the results in this file")
+parser.add_argument("--port", type=int, default=50091, help="port for the loopback stand-in server")
+args = parser.parse_args()
+
+scale = 10 if args.quick else 1
+results = {
+    "package_version": PACKAGE_VERSION,
+    "python": platform.python_version(),
+    "platform": platform.platform(),
+    "quick": args.quick,
+    "parse_dispatch": "inline" if supports(Listener, "dispatch") else "task",
+    "results": {
+        "parse": bench_parse(20000 // scale),
+        "packets": bench_packets(20000 // scale),
+        "prepare_string": bench_prepare(50000 // scale),
+        "dispatch": bench_dispatch(20000 // scale),
+        "end_to_end": bench_end_to_end(2.0 / scale ** 0.5, 500 // scale, args.port),
+    },
+}
+
+text = json.dumps(results, indent=2)
+print(text)
+if args.output:
+    with open(args.output, "w") as output:
+        output.write(text + "\n")
+if args.compare:
+    with open(args.compare) as baseline:
+        compare(results, json.load(baseline))
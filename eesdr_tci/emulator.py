@@ -0,0 +1,369 @@
+"""The emulator module contains the TciEmulator class, a TCI server generating synthetic data streams
+for testing clients and generating load without a radio.  Run it with python -m eesdr_tci.emulator.
+"""
+
+import argparse
+import asyncio
+import math
+
+import websockets
+from websockets.exceptions import WebSocketException
+
+from . import tci
+
+_STREAM_STARTS = {
+    "IQ_START": tci.TciStreamType.IQ_STREAM,
+    "AUDIO_START": tci.TciStreamType.RX_AUDIO_STREAM,
+    "LINE_OUT_START": tci.TciStreamType.RX_AUDIO_STREAM,
+}
+
+_SIGNALS = ("tone", "noise", "silence")
+
+# Number of packets pre-rendered for each stream when not running in real time.
+_RENDERED_PACKETS = 16
+
+def _encode_samples(vals, sample_type):
+    """Converts float samples in [-1.0, 1.0) to the bytes of a TciSampleType."""
+    import numpy as np # pylint: disable=import-outside-toplevel
+
+    if sample_type == tci.TciSampleType.FLOAT32:
+        return vals.astype("<f4").tobytes()
+    if sample_type == tci.TciSampleType.INT16:
+        return (vals * 32767).astype("<i2").tobytes()
+    if sample_type == tci.TciSampleType.INT32:
+        return (vals * 2147483647).astype("<i4").tobytes()
+    widened = (vals * 8388607).astype("<i4").reshape(-1, 1).view(np.uint8)
+    return widened[:, :3].tobytes()
+
+class _Generator:
+    """Produces consecutive packets of one data stream for one receiver."""
+
+    def __init__(self, emulator, data_type, rx):
+        self.emulator = emulator
+        self.data_type = data_type
+        self.rx = rx
+        self.position = 0
+        self._rendered = None
+        self._next = 0
+
+    def config(self):
+        """Returns the (sample_rate, sample_type, channels, frames) of the stream's packets."""
+        emu = self.emulator
+        if self.data_type == tci.TciStreamType.IQ_STREAM:
+            return emu.iq_samplerate, emu.iq_sample_type, 2, emu.iq_samples
+        channels = emu.audio_channels
+        return emu.audio_samplerate, emu.audio_sample_type, channels, max(1, emu.audio_samples // channels)
+
+    def packet_interval(self):
+        """Returns the time covered by one packet, in seconds."""
+        sample_rate, _, _, frames = self.config()
+        return frames / sample_rate
+
+    def next_packet(self):
+        """Returns the bytes of the next packet of the stream."""
+        if self.emulator.realtime:
+            return self._render()
+        config = self.config()
+        if self._rendered is None or self._rendered[0] != config:
+            self._rendered = (config, [self._render() for _ in range(_RENDERED_PACKETS)])
+        packets = self._rendered[1]
+        self._next = (self._next + 1) % len(packets)
+        return packets[self._next]
+
+    def _render(self):
+        import numpy as np # pylint: disable=import-outside-toplevel
+
+        emu = self.emulator
+        sample_rate, sample_type, channels, frames = self.config()
+        t = (self.position + np.arange(frames)) / sample_rate
+        self.position += frames
+        if emu.signal == "tone":
+            signal = emu.level * np.exp(2j * math.pi * emu.tone_freq * t)
+        else:
+            signal = np.zeros(frames, dtype=np.complex128)
+        if emu.signal == "noise" or emu.noise_level:
+            noise_level = emu.level if emu.signal == "noise" else emu.noise_level
+            signal = signal + noise_level * (np.random.standard_normal(frames)
+                                             + 1j * np.random.standard_normal(frames)) / math.sqrt(2)
+        if self.data_type == tci.TciStreamType.IQ_STREAM:
+            vals = np.column_stack((signal.real, signal.imag))
+        else:
+            vals = np.repeat(signal.real.reshape(-1, 1), channels, axis=1)
+        vals = np.clip(vals, -1.0, 1.0 - 2.0**-23)
+        packet = tci.TciDataPacket(self.rx, sample_rate, sample_type, 0, 0, frames * channels, self.data_type,
+                                   channels, _encode_samples(vals, sample_type))
+        return packet.to_bytes()
+
+    def chrono_packet(self):
+        """Returns the bytes of a TX_CHRONO packet requesting one packet of transmit audio."""
+        sample_rate, sample_type, channels, frames = self.config()
+        packet = tci.TciDataPacket(self.rx, sample_rate, sample_type, 0, 0, frames * channels,
+                                   tci.TciStreamType.TX_CHRONO, channels, None)
+        return packet.to_bytes()
+
+class TciEmulator:
+    """TciEmulator instances are TCI servers listening on host and port that emulate an ExpertSDR
+    radio with trx_count receivers of channels_count channels each, for testing clients offline.
+
+    Clients are sent an initialization burst of device information and the state of every receiver,
+    ending with READY.  Writes update the emulated state and are echoed to every client, and reads
+    are answered with the current state.  IQ_START and AUDIO_START (or LINE_OUT_START) start
+    synthetic IQ or RX audio streams for that client and receiver, generated as a tone at tone_freq Hz
+    offset, as noise, or as silence, at level, with optional added noise at noise_level.  While TRX is
+    on for a receiver with audio started, TX_CHRONO packets are also sent.
+
+    IQ_SAMPLERATE, AUDIO_SAMPLERATE, AUDIO_STREAM_SAMPLE_TYPE, AUDIO_STREAM_CHANNELS and
+    AUDIO_STREAM_SAMPLES are taken from the arguments and may be changed by clients.  IQ packets hold
+    iq_samples frames of iq_sample_type samples.  With realtime enabled packets are paced at the
+    sample rate; otherwise each stream sends pre-rendered packets as fast as the client accepts them,
+    for use as a load generator.  The packets_sent counter tracks the data packets sent.
+    """
+
+    def __init__(self, host="127.0.0.1", port=50001, trx_count=2, channels_count=2, iq_samplerate=48000,
+                 audio_samplerate=48000, audio_sample_type=tci.TciSampleType.FLOAT32, audio_channels=2,
+                 audio_samples=2048, iq_sample_type=tci.TciSampleType.FLOAT32, iq_samples=2048,
+                 signal="tone", tone_freq=1000.0, level=0.5, noise_level=0.0, realtime=True):
+        if signal not in _SIGNALS:
+            raise ValueError(f'Signal {signal} unrecognized')
+        self.host = host
+        self.port = port
+        self.trx_count = trx_count
+        self.channels_count = channels_count
+        self.iq_samplerate = iq_samplerate
+        self.audio_samplerate = audio_samplerate
+        self.audio_sample_type = tci.TciSampleType(audio_sample_type)
+        self.audio_channels = audio_channels
+        self.audio_samples = audio_samples
+        self.iq_sample_type = tci.TciSampleType(iq_sample_type)
+        self.iq_samples = iq_samples
+        self.signal = signal
+        self.tone_freq = tone_freq
+        self.level = level
+        self.noise_level = noise_level
+        self.realtime = realtime
+        self.packets_sent = 0
+        self.state = {}
+        self._clients = set()
+        self._stream_tasks = set()
+        self._server = None
+        self._init_state()
+
+    def _set_state(self, command):
+        cmd_info, fields = tci.split_command_string(command)
+        self.state[tci.command_state_key(cmd_info, fields)] = command.rstrip(";") + ";"
+
+    def _init_state(self):
+        """Fills the emulated state sent to clients on connection."""
+        for command in (
+                "protocol:ExpertSDR3,1.9",
+                "device:SunSDR2DX",
+                "receive_only:false",
+                f"trx_count:{self.trx_count}",
+                f"channels_count:{self.channels_count}",
+                "vfo_limits:10000,74000000",
+                "if_limits:-48000,48000",
+                "modulations_list:AM,SAM,DSB,LSB,USB,CW,NFM,DIGL,DIGU,WFM,DRM"):
+            self._set_state(command)
+        for rx in range(self.trx_count):
+            dds = 7000000 + 100000 * rx
+            self._set_state(f"dds:{rx},{dds}")
+            for channel in range(self.channels_count):
+                self._set_state(f"if:{rx},{channel},{1000 * channel}")
+                self._set_state(f"vfo:{rx},{channel},{dds + 1000 * channel}")
+                self._set_state(f"rx_channel_enable:{rx},{channel},{'true' if channel == 0 else 'false'}")
+                self._set_state(f"rx_volume:{rx},{channel},0")
+                self._set_state(f"rx_balance:{rx},{channel},0")
+            for command in ("modulation:{rx},USB", "rx_enable:{rx},true", "trx:{rx},false", "tune:{rx},false",
+                            "drive:{rx},50", "tune_drive:{rx},10", "rit_enable:{rx},false", "xit_enable:{rx},false",
+                            "split_enable:{rx},false", "rit_offset:{rx},0", "xit_offset:{rx},0",
+                            "rx_filter_band:{rx},-2700,-100", "rx_mute:{rx},false", "agc_mode:{rx},normal",
+                            "agc_gain:{rx},0", "lock:{rx},false", "sql_enable:{rx},false", "sql_level:{rx},-140"):
+                self._set_state(command.format(rx=rx))
+        for command in ("volume:-6", "mute:false", "mon_volume:-20", "mon_enable:false", "cw_keyer_speed:25",
+                        "cw_macros_speed:25", "cw_macros_delay:10", "digl_offset:1500", "digu_offset:1500",
+                        f"iq_samplerate:{self.iq_samplerate}", f"audio_samplerate:{self.audio_samplerate}",
+                        f"audio_stream_sample_type:{self.audio_sample_type.name.lower()}",
+                        f"audio_stream_channels:{self.audio_channels}",
+                        f"audio_stream_samples:{self.audio_samples}", "start"):
+            self._set_state(command)
+
+    def _apply_config(self, name, fields):
+        """Updates the stream configuration from a write by a client."""
+        value = fields[0]
+        if name == "IQ_SAMPLERATE":
+            self.iq_samplerate = int(value)
+        elif name == "AUDIO_SAMPLERATE":
+            self.audio_samplerate = int(value)
+        elif name == "AUDIO_STREAM_SAMPLE_TYPE":
+            self.audio_sample_type = tci.TciSampleType[value.upper()]
+        elif name == "AUDIO_STREAM_CHANNELS":
+            self.audio_channels = int(value)
+        elif name == "AUDIO_STREAM_SAMPLES":
+            self.audio_samples = int(value)
+
+    def trx_enabled(self, rx):
+        """Returns True if TRX is on for a receiver."""
+        command = self.state.get(("TRX", str(rx), None), "")
+        return ",true" in command.lower()
+
+    async def start(self):
+        """Coroutine that starts accepting client connections."""
+        self._server = await websockets.serve(self._serve_client, self.host, self.port)
+
+    def close(self):
+        """Stops accepting clients, stops every data stream and closes the server."""
+        if self._server is not None:
+            self._server.close()
+        for task in list(self._stream_tasks):
+            task.cancel()
+
+    async def wait(self):
+        """Coroutine that waits until the server is closed."""
+        await self._server.wait_closed()
+
+    async def _serve_client(self, ws, *_):
+        """Coroutine handling a client connection."""
+        streams = {}
+        self._clients.add(ws)
+        try:
+            await ws.send("".join(self.state.values()) + "ready;")
+            async for message in ws:
+                if isinstance(message, bytes):
+                    continue
+                for command in message.split(";"):
+                    if command:
+                        await self._client_command(ws, streams, command)
+        except WebSocketException:
+            pass
+        finally:
+            self._clients.discard(ws)
+            for task in streams.values():
+                task.cancel()
+
+    async def _client_command(self, ws, streams, command):
+        """Coroutine that handles a single command from a client."""
+        cmd_info, fields = tci.split_command_string(command)
+        if cmd_info is None:
+            return
+        name = cmd_info.name
+
+        if name in _STREAM_STARTS or name in tci.STREAM_STOPS:
+            rx = int(fields[0]) if fields else 0
+            start = tci.STREAM_STOPS.get(name, name)
+            key = (_STREAM_STARTS[start], rx)
+            task = streams.pop(key, None)
+            if task is not None:
+                task.cancel()
+            if name in _STREAM_STARTS:
+                task = asyncio.create_task(self._stream_main(ws, _Generator(self, key[0], rx)))
+                self._stream_tasks.add(task)
+                task.add_done_callback(self._stream_done)
+                streams[key] = task
+            await ws.send(f'{name.lower()}:{rx};')
+            return
+
+        key = tci.command_state_key(cmd_info, fields)
+        if len(fields) < cmd_info.total_params():
+            if key in self.state:
+                await ws.send(self.state[key])
+            return
+
+        if not cmd_info.writeable:
+            return
+        # Optional send-only arguments, such as the signal source of TRX, are not echoed by the radio.
+        if cmd_info.param_count != -1:
+            fields = fields[:cmd_info.total_params()]
+        try:
+            cmd_info.parse_params(",".join(fields))
+        except ValueError:
+            return
+        if name in ("IQ_SAMPLERATE", "AUDIO_SAMPLERATE", "AUDIO_STREAM_SAMPLE_TYPE", "AUDIO_STREAM_CHANNELS",
+                    "AUDIO_STREAM_SAMPLES"):
+            self._apply_config(name, fields)
+        echo = f'{command.partition(":")[0]}:{",".join(fields)};'
+        if cmd_info.readable or key in self.state:
+            self.state[key] = echo
+        for client in list(self._clients):
+            try:
+                await client.send(echo)
+            except WebSocketException:
+                pass
+
+    def _stream_done(self, task):
+        """Forgets a finished stream task, reporting any exception it raised to the loop's exception handler."""
+        self._stream_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            task.get_loop().call_exception_handler({
+                "message": "Exception in emulator data stream",
+                "exception": task.exception(),
+                "task": task,
+            })
+
+    async def _stream_main(self, ws, generator):
+        """Coroutine sending the packets of one stream to a client until it stops the stream or
+        disconnects.
+        """
+        try:
+            await self._send_packets(ws, generator)
+        except WebSocketException:
+            pass
+
+    async def _send_packets(self, ws, generator):
+        """Coroutine sending the packets of one stream to a client."""
+        loop = asyncio.get_running_loop()
+        next_time = loop.time()
+        while True:
+            await ws.send(generator.next_packet())
+            self.packets_sent += 1
+            if generator.data_type == tci.TciStreamType.RX_AUDIO_STREAM and self.trx_enabled(generator.rx):
+                await ws.send(generator.chrono_packet())
+                self.packets_sent += 1
+            if self.realtime:
+                next_time += generator.packet_interval()
+                delay = next_time - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                else:
+                    next_time = loop.time()
+            else:
+                await asyncio.sleep(0)
+
+def main(argv=None):
+    """Runs an emulator from the command line until interrupted."""
+    parser = argparse.ArgumentParser(description="Emulated TCI server generating synthetic data streams.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=50001)
+    parser.add_argument("--trx-count", type=int, default=2)
+    parser.add_argument("--channels-count", type=int, default=2)
+    parser.add_argument("--iq-samplerate", type=int, default=48000)
+    parser.add_argument("--audio-samplerate", type=int, default=48000)
+    parser.add_argument("--audio-sample-type", choices=[t.name.lower() for t in tci.TciSampleType], default="float32")
+    parser.add_argument("--audio-channels", type=int, default=2)
+    parser.add_argument("--audio-samples", type=int, default=2048)
+    parser.add_argument("--iq-sample-type", choices=[t.name.lower() for t in tci.TciSampleType], default="float32")
+    parser.add_argument("--iq-samples", type=int, default=2048)
+    parser.add_argument("--signal", choices=_SIGNALS, default="tone")
+    parser.add_argument("--tone-freq", type=float, default=1000.0)
+    parser.add_argument("--level", type=float, default=0.5)
+    parser.add_argument("--noise-level", type=float, default=0.0)
+    parser.add_argument("--fast", action="store_true", help="send packets as fast as possible instead of in real time")
+    args = parser.parse_args(argv)
+
+    emulator = TciEmulator(args.host, args.port, args.trx_count, args.channels_count, args.iq_samplerate,
+                           args.audio_samplerate, tci.TciSampleType[args.audio_sample_type.upper()],
+                           args.audio_channels, args.audio_samples, tci.TciSampleType[args.iq_sample_type.upper()],
+                           args.iq_samples, signal=args.signal, tone_freq=args.tone_freq, level=args.level,
+                           noise_level=args.noise_level, realtime=not args.fast)
+
+    async def _run():
+        await emulator.start()
+        print(f"Emulating TCI server on ws://{args.host}:{args.port}")
+        await emulator.wait()
+
+    try:
+        asyncio.run(_run())
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""The executor module contains the ExecutorCallback class used to run CPU-heavy data callbacks in a
+thread or process pool instead of the event loop.
+"""
+
+import asyncio
+import inspect
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+class ExecutorCallback:
+    """ExecutorCallback instances wrap a data callback so that each packet is processed in an
+    executor, leaving the event loop free to keep receiving.  They are normally created by
+    Listener.add_data_listener() when an executor is given.
+
+    The executor is "thread" or "process" to create a pool of max_workers, shut down by close(), or an
+    existing concurrent.futures.Executor, which is left open.  Under "process" the callback must be a
+    picklable module-level function, and each packet is pickled with its data copied.
+
+    At most max_inflight packets are submitted at once.  Packets arriving while that many are in
+    flight are dropped, counted by the dropped counter.  The value returned by the callback for each
+    packet is passed to on_result on the event loop, in the order the packets were received, and may
+    be a coroutine.  Exceptions raised by the callback are reported to the loop's exception handler.
+    """
+
+    # Executor classes created for each executor name.
+    EXECUTOR_TYPES = {"thread": ThreadPoolExecutor, "process": ProcessPoolExecutor}
+
+    def __init__(self, callback, executor="thread", max_inflight=4, on_result=None, max_workers=None):
+        if isinstance(executor, Executor):
+            self.executor = executor
+            self._owns_executor = False
+        elif executor in self.EXECUTOR_TYPES:
+            self.executor = self.EXECUTOR_TYPES[executor](max_workers=max_workers)
+            self._owns_executor = True
+        else:
+            raise ValueError(f'Executor {executor} unrecognized')
+        if max_inflight < 1:
+            raise ValueError('Executor max_inflight must be at least 1')
+        self.callback = callback
+        self.max_inflight = max_inflight
+        self.on_result = on_result
+        self.submitted = 0
+        self.completed = 0
+        self.dropped = 0
+        self._inflight = deque()
+        self._closed = False
+
+    def __call__(self, packet):
+        """Submits a packet to the executor, or drops it if max_inflight packets are in flight."""
+        if self._closed:
+            return
+        if len(self._inflight) >= self.max_inflight:
+            self.dropped += 1
+            return
+        future = asyncio.get_running_loop().run_in_executor(self.executor, self.callback, packet)
+        self._inflight.append(future)
+        self.submitted += 1
+        future.add_done_callback(self._deliver)
+
+    def in_flight(self):
+        """Returns the number of packets submitted whose results have not been delivered yet."""
+        return len(self._inflight)
+
+    def _deliver(self, _future):
+        """Delivers the results of completed jobs, stopping at the first job still running."""
+        inflight = self._inflight
+        while inflight and inflight[0].done():
+            future = inflight.popleft()
+            self.completed += 1
+            if future.cancelled():
+                continue
+            exc = future.exception()
+            if exc is not None:
+                future.get_loop().call_exception_handler({
+                    "message": f'Exception in executor callback {self.callback!r}',
+                    "exception": exc,
+                })
+                continue
+            if self.on_result is None:
+                continue
+            try:
+                res = self.on_result(future.result())
+            except Exception as exc:  # pylint: disable=broad-except
+                future.get_loop().call_exception_handler({
+                    "message": f'Exception in result callback {self.on_result!r}',
+                    "exception": exc,
+                })
+                continue
+            if inspect.isawaitable(res):
+                task = asyncio.ensure_future(res)
+                task.add_done_callback(lambda task: task.result())
+
+    def close(self):
+        """Stops submitting packets, and shuts down the executor if it was created by this instance.
+        Jobs already submitted still complete and deliver their results.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        if self._owns_executor:
+            self.executor.shutdown(wait=False)
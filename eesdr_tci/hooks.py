@@ -0,0 +1,215 @@
+"""The hooks module contains hooks that can be added to a Listener to observe the parsing of received
+frames, their dispatch and each callback, such as a slow callback detector and a profiler window.
+"""
+
+from collections import namedtuple
+import itertools
+import logging
+import sys
+import threading
+import time
+import traceback
+
+from .metrics import _callback_name
+
+_logger = logging.getLogger(__name__)
+
+SlowCallback = namedtuple("SlowCallback", ["stage", "name", "elapsed", "stack"])
+SlowCallback.__doc__ = """Report of a stage exceeding the time budget of a SlowCallbackWatchdog.
+The stack is a traceback.StackSummary sampled from the event loop thread while the stage was still
+running, or None if it finished before being sampled."""
+
+class DispatchHook:
+    """Base class of hooks added with Listener.add_hook().
+
+    The listener calls enter(stage, target) when a stage begins and exit(stage, target, token) when
+    it ends, passing back the token returned by enter().  The stage is "parse" while a received frame
+    is decoded, with the target "data" or the command name, "dispatch" while callbacks are notified,
+    with the target the data stream type or command name, and "callback" while each callback runs,
+    with the target the callback itself.  A coroutine callback is notified as a separate "callback"
+    stage around each step it runs on the event loop, so the time it spends awaiting is not included.
+    Hooks are called from the event loop thread and should return quickly.
+    """
+
+    def enter(self, stage, target):
+        """Called when a stage begins, returning a token passed back to exit()."""
+        return None
+
+    def exit(self, stage, target, token):
+        """Called when a stage ends."""
+
+class _HookedSteps:
+    """Awaitable running a coroutine callback one step at a time, calling enter() before and exit()
+    after each step it runs on the event loop.  enter() returns the tokens passed to exit().
+    """
+
+    __slots__ = ("_awaitable", "_enter", "_exit")
+
+    def __init__(self, awaitable, enter, exit_):
+        self._awaitable = awaitable
+        self._enter = enter
+        self._exit = exit_
+
+    def __await__(self):
+        steps = self._awaitable.__await__()
+        value = None
+        error = None
+        while True:
+            tokens = self._enter()
+            try:
+                if error is None:
+                    yielded = steps.send(value)
+                else:
+                    yielded = steps.throw(error)
+            except StopIteration as stop:
+                return stop.value
+            finally:
+                self._exit(tokens)
+            try:
+                value = yield yielded
+                error = None
+            except GeneratorExit:
+                steps.close()
+                raise
+            except BaseException as exc:  # pylint: disable=broad-except
+                value = None
+                error = exc
+
+def _target_name(target):
+    """Returns a printable name for a hook target."""
+    if isinstance(target, str):
+        return target
+    name = getattr(target, "name", None)
+    if isinstance(name, str):
+        return name
+    return _callback_name(target)
+
+class SlowCallbackWatchdog(DispatchHook):
+    """SlowCallbackWatchdog hooks flag stages running longer than budget seconds, by default only
+    callbacks.  A background thread checks the running stages every interval seconds (budget / 2 by
+    default) and samples the stack of the event loop thread when one is over budget, so the code
+    blocking the loop can be found.  Stages exceeding the budget between checks are flagged when they
+    end, without a stack.
+
+    Each report is passed as a SlowCallback to on_slow, called from the watchdog thread for sampled
+    reports, or logged as a warning if on_slow is None.  The flagged counter tracks the reports made.
+    Coroutine callbacks are timed one step at a time, so only a step blocking the event loop for
+    longer than the budget is flagged, not a callback awaiting slow I/O.
+    """
+
+    def __init__(self, budget=0.05, on_slow=None, interval=None, stages=("callback",)):
+        self.budget = budget
+        self.on_slow = on_slow
+        self.interval = interval if interval is not None else budget / 2
+        self.stages = frozenset(stages)
+        self.flagged = 0
+        self._active = {}
+        self._tokens = itertools.count()
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def enter(self, stage, target):
+        if stage not in self.stages:
+            return None
+        token = next(self._tokens)
+        with self._lock:
+            self._active[token] = [stage, target, time.monotonic(), threading.get_ident(), False]
+        if self._thread is None:
+            self.start()
+        return token
+
+    def exit(self, stage, target, token):
+        if token is None:
+            return
+        with self._lock:
+            entry = self._active.pop(token, None)
+        if entry is None or entry[4]:
+            return
+        elapsed = time.monotonic() - entry[2]
+        if elapsed > self.budget:
+            self._report(SlowCallback(stage, _target_name(target), elapsed, None))
+
+    def start(self):
+        """Starts the watchdog thread.  Called automatically when the first stage is entered."""
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._watch, name="SlowCallbackWatchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stops the watchdog thread."""
+        if self._thread is None:
+            return
+        self._stop_event.set()
+        if self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+
+    def _watch(self):
+        while not self._stop_event.wait(self.interval):
+            now = time.monotonic()
+            overdue = []
+            with self._lock:
+                for entry in self._active.values():
+                    if not entry[4] and now - entry[2] > self.budget:
+                        entry[4] = True
+                        overdue.append(entry)
+            if not overdue:
+                continue
+            frames = sys._current_frames()  # pylint: disable=protected-access
+            for stage, target, started, thread_id, _ in overdue:
+                frame = frames.get(thread_id)
+                stack = traceback.extract_stack(frame) if frame is not None else None
+                self._report(SlowCallback(stage, _target_name(target), now - started, stack))
+
+    def _report(self, report):
+        self.flagged += 1
+        if self.on_slow is not None:
+            self.on_slow(report)
+            return
+        stack = "".join(report.stack.format()) if report.stack is not None else ""
+        _logger.warning("%s %s took %.3f sec, over the %.3f sec budget\n%s",
+                        report.stage, report.name, report.elapsed, self.budget, stack)
+
+def _profiler_methods(profiler):
+    """Returns the (start, stop) functions of a profiler with enable/disable or start/stop methods."""
+    if hasattr(profiler, "enable") and hasattr(profiler, "disable"):
+        return profiler.enable, profiler.disable
+    if hasattr(profiler, "start") and hasattr(profiler, "stop"):
+        return profiler.start, profiler.stop
+    raise ValueError(f'Profiler {profiler!r} has neither enable/disable nor start/stop methods')
+
+class ProfilerHook(DispatchHook):
+    """ProfilerHook hooks run a profiler for a window of duration seconds, or until stop() is called
+    if duration is None.  The profiler may be an object with enable/disable methods, such as a
+    cProfile.Profile, or with start/stop methods, such as the yappi module.  It is started when the
+    listener next enters a stage, so it runs on the event loop thread, and stopped when the first stage
+    ending after the window has elapsed.  The done attribute is set once the window has ended.
+    """
+
+    def __init__(self, profiler, duration=None):
+        self.profiler = profiler
+        self.duration = duration
+        self.done = False
+        self._start, self._stop = _profiler_methods(profiler)
+        self._started = None
+
+    def enter(self, stage, target):
+        if self._started is None and not self.done:
+            self._started = time.monotonic()
+            self._start()
+        return None
+
+    def exit(self, stage, target, token):
+        if self.duration is not None and self._started is not None and \
+                time.monotonic() - self._started >= self.duration:
+            self.stop()
+
+    def stop(self):
+        """Ends the profiling window."""
+        if self._started is not None:
+            self._stop()
+            self._started = None
+        self.done = True
@@ -2,9 +2,25 @@
 
 import asyncio
 from asyncio.exceptions import CancelledError
+import inspect
+import time
 import websockets
+from websockets.exceptions import WebSocketException
 
 from . import tci
+from .executor import ExecutorCallback
+from .hooks import _HookedSteps
+from .metrics import ListenerMetrics
+from .sender import SendQueue
+from .state import ParamState
+from .stream import DataStream
+
+# Commands replayed after reconnecting, in this order: stream configuration written by the client,
+# then other parameters written by the client, then the streams the client had started.
+_REPLAY_CONFIG = frozenset(("IQ_SAMPLERATE", "AUDIO_SAMPLERATE", "AUDIO_STREAM_SAMPLE_TYPE",
+                            "AUDIO_STREAM_CHANNELS", "AUDIO_STREAM_SAMPLES", "TX_STREAM_AUDIO_BUFFERING",
+                            "RX_SENSORS_ENABLE", "TX_SENSORS_ENABLE"))
+_REPLAY_STREAMS = frozenset(tci.STREAM_STOPS.values())
 
 class Listener:
     """The Listener class interacts with the TCI server by listening for parameter updates.
@@ -13,181 +29,653 @@ class Listener:
     as many commands may be ignorable in certain use cases.
     """
 
-    def __init__(self, uri):
+    DISPATCH_MODES = ("task", "inline")
+
+    def __init__(self, uri, dispatch="task", zero_copy=False, track_state=False, changes_only=False,
+                 coalesce=False, send_bulk_maxsize=64,
+                 batch_commands=False, reconnect=False, reconnect_delay=0.5, reconnect_max_delay=30.0,
+                 metrics=False):
+        """Creates a listener for the TCI server at uri.
+
+        dispatch is "task" to schedule each coroutine callback as its own task, or "inline" to call
+        callbacks from the receive loop in registration order.  zero_copy gives data packets a view of
+        the received frame (see TciDataPacket.from_buf).  track_state keeps the latest value of each
+        parameter in the state attribute (see ParamState), and changes_only also notifies parameter
+        callbacks only when a value changes.  coalesce merges queued writes to the same parameter (see
+        SendQueue), send_bulk_maxsize bounds the queued data packets, and batch_commands packs queued
+        command strings into one frame.  reconnect retries a lost connection with exponential backoff
+        between reconnect_delay and reconnect_max_delay seconds, then replays the stream configuration,
+        written parameters and stream starts of this client.  metrics measures the listener in the
+        metrics attribute (see ListenerMetrics).
+        """
+        if dispatch not in Listener.DISPATCH_MODES:
+            raise ValueError(f'Dispatch mode {dispatch} unrecognized')
         self.uri = uri
+        self.dispatch = dispatch
+        self.zero_copy = zero_copy
+        self.changes_only = changes_only
+        self.coalesce = coalesce
+        self.send_bulk_maxsize = send_bulk_maxsize
+        self.batch_commands = batch_commands
+        self.reconnect = reconnect
+        self.reconnect_delay = reconnect_delay
+        self.reconnect_max_delay = reconnect_max_delay
+        self.reconnects = 0
+        self.last_ready_delay = None
+        self.last_streaming_delay = None
+        self.state = ParamState() if track_state or changes_only else None
+        self.metrics = ListenerMetrics() if metrics else None
         self._tci_param_listeners = {}
         self._tci_data_listeners = {}
+        self._tci_data_dispatch = {}
+        self._tci_streams = []
+        self._tci_closeables = []
+        self._tci_offloaded = {}
+        self._tci_blocking_streams = ()
         self._tci_send = None
         self._launch_task = None
         self._connected_event = None
         self._ready_event = None
-
-    @staticmethod
-    def _convert_type(val):
-        """Converts a string to int, float, or bool if possible, but returning the string if not."""
-        try:
-            return int(val)
-        except (ValueError, TypeError):
-            pass
-
-        try:
-            return float(val)
-        except (ValueError, TypeError):
-            pass
-
-        if val.upper() == "TRUE":
-            return True
-        if val.upper() == "FALSE":
-            return False
-
-        return val
-
-    def add_param_listener(self, param, callback):
+        self._tci_pending = {}
+        self._tci_pending_names = {}
+        self._tci_replay = {}
+        self._disconnected_at = None
+        self._tci_hooks = ()
+        self._tci_frame_listeners = ()
+        self._select_dispatch()
+        self._rebuild_param_dispatch()
+
+    def add_param_listener(self, param, callback, rx=None, sub_rx=None):
         """Registers a callback to be notified of a particular parameter change.
 
         The callback signature is (param_name, rx, sub_rx, params).
         The special param "*" can be used to register a listener for all parameters.
+        Notifications can be limited to a particular receiver and/or sub-receiver by passing rx and/or
+        sub_rx, in which case parameters without those numbers are not delivered to the callback.
         """
         if param not in self._tci_param_listeners:
             self._tci_param_listeners[param] = []
         l = self._tci_param_listeners[param]
-        if callback not in l:
-            l += [callback]
+        entry = (callback, rx, sub_rx)
+        if entry not in l:
+            l += [entry]
+            self._rebuild_param_dispatch()
 
-    def remove_param_listener(self, param, callback):
+    def remove_param_listener(self, param, callback, rx=None, sub_rx=None):
         """Removes a parameter callback from the notification list"""
         l = self._tci_param_listeners[param]
-        if callback in l:
-            l.remove(callback)
+        entry = (callback, rx, sub_rx)
+        if entry in l:
+            l.remove(entry)
+            self._rebuild_param_dispatch()
 
-    def add_data_listener(self, data_type, callback):
+    def add_data_listener(self, data_type, callback, rx=None, executor=None, max_inflight=4, on_result=None,
+                          max_workers=None):
         """Registers a callback to be notified when a particular type of data packet is received.
 
         The callback signature is (packet).
         The special data_type "*" can be used to register a listener for all data types.
+        Notifications can be limited to packets from a particular receiver by passing rx.
+
+        If executor is "thread", "process" or a concurrent.futures.Executor, the callback is run in the
+        executor rather than the event loop, with at most max_inflight packets in flight and later
+        packets dropped, and its results are passed to on_result in order (see ExecutorCallback).
+        A "thread" or "process" pool is created with max_workers and shut down with the listener.
+        The ExecutorCallback is returned in that case.
         """
         if data_type not in self._tci_data_listeners:
             self._tci_data_listeners[data_type] = []
         l = self._tci_data_listeners[data_type]
-        if callback not in l:
-            l += [callback]
-
-    def remove_data_listener(self, data_type, callback):
+        entry = (callback, rx, None)
+        offloaded = None
+        if executor is not None:
+            offloaded = self._tci_offloaded.get((data_type, entry))
+            if offloaded is None:
+                offloaded = ExecutorCallback(callback, executor, max_inflight, on_result, max_workers)
+                self._tci_offloaded[(data_type, entry)] = offloaded
+            entry = (offloaded, rx, None)
+        if entry not in l:
+            l += [entry]
+            self._rebuild_data_dispatch()
+        return offloaded
+
+    def remove_data_listener(self, data_type, callback, rx=None):
         """Removes a data callback from the notification list."""
         l = self._tci_data_listeners[data_type]
-        if callback in l:
-            l.remove(callback)
-
-    def _get_param_listeners(self, item):
-        """Retrieves the list of all parameter callbacks to notify for a particular parameter."""
-        res = []
-        if item in self._tci_param_listeners:
-            res += self._tci_param_listeners[item]
-        if "*" in self._tci_param_listeners:
-            res += self._tci_param_listeners["*"]
-        return res
+        entry = (callback, rx, None)
+        offloaded = self._tci_offloaded.pop((data_type, entry), None)
+        if offloaded is not None:
+            offloaded.close()
+            entry = (offloaded, rx, None)
+        if entry in l:
+            l.remove(entry)
+            self._rebuild_data_dispatch()
+
+    def add_frame_listener(self, callback):
+        """Registers a callback to be passed every frame received from the server, before it is decoded.
+
+        The callback signature is (frame), with frame the received bytes or str.  It is called
+        directly from the receive loop, so it must not block, and its return value is ignored.
+        """
+        if callback not in self._tci_frame_listeners:
+            self._tci_frame_listeners += (callback,)
 
-    def _get_data_listeners(self, item):
-        """Retrieves the list of all data callbacks to notify for a particular data type."""
-        res = []
-        if item in self._tci_data_listeners:
-            res += self._tci_data_listeners[item]
-        if "*" in self._tci_data_listeners:
-            res += self._tci_data_listeners["*"]
-        return res
+    def remove_frame_listener(self, callback):
+        """Removes a frame callback from the notification list"""
+        if callback in self._tci_frame_listeners:
+            self._tci_frame_listeners = tuple(c for c in self._tci_frame_listeners if c is not callback)
+
+    def add_hook(self, hook):
+        """Registers a hook to be notified around the parsing and dispatch of received frames and
+        around each callback (see DispatchHook).
+        """
+        if hook not in self._tci_hooks:
+            self._tci_hooks += (hook,)
+            self._select_dispatch()
+
+    def remove_hook(self, hook):
+        """Removes a hook from the notification list"""
+        if hook in self._tci_hooks:
+            self._tci_hooks = tuple(h for h in self._tci_hooks if h is not hook)
+            self._select_dispatch()
+
+    def _select_dispatch(self):
+        """Selects the dispatcher, timing callbacks only if metrics or hooks are enabled."""
+        self._tci_instrumented = self.metrics is not None or bool(self._tci_hooks)
+        if self.dispatch == "inline":
+            self._dispatch = self._dispatch_inline_timed if self._tci_instrumented else self._dispatch_inline
+        else:
+            self._dispatch = self._dispatch_task_timed if self._tci_instrumented else self._dispatch_task
+
+    def stream(self, data_type, rx=None, maxsize=64, overflow="drop_oldest"):
+        """Returns a DataStream yielding received data packets of data_type through async iteration.
+
+        Packets can be limited to a single receiver with rx.  At most maxsize packets are buffered, with
+        overflow set to "drop_oldest", "drop_newest" or "block" to decide what happens when the consumer
+        falls behind (see DataStream).  The stream is removed from the listener when closed.
+        """
+        stream = DataStream(data_type, rx, maxsize, overflow, on_close=self._remove_stream)
+        self._tci_streams += [stream]
+        self._tci_blocking_streams = tuple(s for s in self._tci_streams if s.overflow == "block")
+        self.add_data_listener(data_type, stream, rx)
+        return stream
+
+    def add_closeable(self, closeable):
+        """Registers an object, such as a recorder attached to this listener, whose close() is called at
+        shutdown.
+        """
+        if closeable not in self._tci_closeables:
+            self._tci_closeables += [closeable]
+
+    def remove_closeable(self, closeable):
+        """Removes an object from the list closed at shutdown."""
+        if closeable in self._tci_closeables:
+            self._tci_closeables.remove(closeable)
+
+    async def _feed(self, ws):
+        """Coroutine that runs the receive loop over ws in place of a server connection until ws raises
+        EOFError.  Sending is only possible meanwhile if the listener has also been started.
+        """
+        if self._ready_event is None:
+            self._ready_event = asyncio.Event()
+        try:
+            await self._listen_main(ws)
+        except EOFError:
+            pass
+
+    def _remove_stream(self, stream):
+        """Unregisters a closed DataStream."""
+        self.remove_data_listener(stream.data_type, stream, stream.rx)
+        self._tci_streams.remove(stream)
+        self._tci_blocking_streams = tuple(s for s in self._tci_streams if s.overflow == "block")
+
+    @staticmethod
+    def _match_listeners(listeners, item, rx, sub_rx):
+        """Collects the callbacks registered for item or "*" whose receiver filters match rx and sub_rx."""
+        entries = listeners.get(item, []) + listeners.get("*", [])
+        return tuple(callback for callback, cb_rx, cb_sub_rx in entries
+                     if (cb_rx is None or cb_rx == rx) and (cb_sub_rx is None or cb_sub_rx == sub_rx))
+
+    def _rebuild_param_dispatch(self):
+        """Resets the parameter dispatch index after the registered callbacks change."""
+        self._tci_param_dispatch = {}
+        self._tci_param_names = frozenset(item for item, l in self._tci_param_listeners.items() if l)
+        self._tci_param_decode_all = "*" in self._tci_param_names or self.state is not None
+
+    def _rebuild_data_dispatch(self):
+        """Resets the data dispatch index after the registered callbacks change."""
+        self._tci_data_dispatch = {}
+
+    def _wants_param(self, item):
+        """Returns True if a received parameter needs to be decoded, e.g. because callbacks are registered for it."""
+        return self._tci_param_decode_all or item in self._tci_param_names or item in self._tci_pending_names
+
+    def _add_pending(self, key, future):
+        """Registers a future to be resolved with the next value received for key."""
+        self._tci_pending.setdefault(key, []).append(future)
+        self._tci_pending_names[key[0]] = self._tci_pending_names.get(key[0], 0) + 1
+
+    def _remove_pending(self, key, future):
+        """Unregisters a future added with _add_pending if it is still waiting."""
+        futures = self._tci_pending.get(key)
+        if futures is None or future not in futures:
+            return
+        futures.remove(future)
+        if not futures:
+            del self._tci_pending[key]
+        count = self._tci_pending_names[key[0]] - 1
+        if count:
+            self._tci_pending_names[key[0]] = count
+        else:
+            del self._tci_pending_names[key[0]]
+
+    def _resolve_pending(self, key, params):
+        """Resolves all futures waiting for key with the received value."""
+        for future in list(self._tci_pending.get(key, ())):
+            self._remove_pending(key, future)
+            if not future.done():
+                future.set_result(params)
+
+    def _get_param_listeners(self, item, rx=None, sub_rx=None):
+        """Retrieves the tuple of all parameter callbacks to notify for a particular parameter.
+
+        Results are cached in the dispatch index until the registered callbacks change.
+        """
+        key = (item, rx, sub_rx)
+        callbacks = self._tci_param_dispatch.get(key)
+        if callbacks is None:
+            callbacks = Listener._match_listeners(self._tci_param_listeners, item, rx, sub_rx)
+            self._tci_param_dispatch[key] = callbacks
+        return callbacks
+
+    def _get_data_listeners(self, item, rx=None):
+        """Retrieves the tuple of all data callbacks to notify for a particular data type and receiver.
+
+        Results are cached in the dispatch index until the registered callbacks change.
+        """
+        key = (item, rx)
+        callbacks = self._tci_data_dispatch.get(key)
+        if callbacks is None:
+            callbacks = Listener._match_listeners(self._tci_data_listeners, item, rx, None)
+            self._tci_data_dispatch[key] = callbacks
+        return callbacks
+
+    @staticmethod
+    def _report_callback_error(callback, exc):
+        """Passes an exception raised by a callback to the event loop's exception handler."""
+        asyncio.get_running_loop().call_exception_handler({
+            "message": f'Exception in callback {callback!r}',
+            "exception": exc,
+        })
 
     def _schedule_callback(self, callback, *callback_args):
-        """Schedules a notification callback, ensuring that the status is checked when complete."""
-        task = asyncio.create_task(callback(*callback_args))
+        """Calls a notification callback, scheduling a task if it returns an awaitable and ensuring that
+        the status is checked when complete.  Exceptions raised by the call are reported to the event
+        loop's exception handler rather than ending the receive loop.
+        """
+        try:
+            res = callback(*callback_args)
+        except Exception as exc:  # pylint: disable=broad-except
+            self._report_callback_error(callback, exc)
+            return
+        if not inspect.isawaitable(res):
+            return
+        task = asyncio.ensure_future(res)
         task.add_done_callback(lambda task: task.result())
 
-    async def _listen_main(self, ws):
-        """Coroutine that receives from the server and schedules data/parameter callbacks."""
-        while True:
-            status = await ws.recv()
+    async def _dispatch_task(self, callbacks, *callback_args):
+        """Notifies callbacks by scheduling a task for each coroutine callback."""
+        for callback in callbacks:
+            self._schedule_callback(callback, *callback_args)
 
-            if isinstance(status, bytes):
-                packet = tci.TciDataPacket.from_buf(status)
-                for callback in self._get_data_listeners(packet.data_type):
-                    self._schedule_callback(callback, packet)
-                continue
+    async def _dispatch_inline(self, callbacks, *callback_args):
+        """Notifies callbacks in order from the receive loop, awaiting coroutine callbacks in turn."""
+        for callback in callbacks:
+            try:
+                res = callback(*callback_args)
+                if inspect.isawaitable(res):
+                    await res
+            except Exception as exc:  # pylint: disable=broad-except
+                self._report_callback_error(callback, exc)
 
-            parts = status.strip(";").split(":", 1)
-            cmd_name = parts[0].upper()
-            if cmd_name not in tci.COMMANDS:
-                raise ValueError(f'Command {cmd_name} unrecognized')
+    def _enter_hooks(self, stage, target):
+        """Notifies hooks that a stage begins, returning the tokens to pass to _exit_hooks."""
+        return [(hook, hook.enter(stage, target)) for hook in self._tci_hooks]
 
-            cmd_info = tci.COMMANDS[cmd_name]
-            expected_params = cmd_info.total_params()
+    @staticmethod
+    def _exit_hooks(stage, target, tokens):
+        """Notifies hooks that a stage ends."""
+        for hook, token in tokens:
+            hook.exit(stage, target, token)
+
+    def _callback_finished(self, callback, start, tokens):
+        """Records the execution time of a callback in metrics and notifies hooks that it ended."""
+        if self.metrics is not None:
+            self.metrics.record_callback(callback, time.perf_counter() - start)
+        if tokens:
+            self._exit_hooks("callback", callback, tokens)
+
+    def _call_timed(self, callback, callback_args):
+        """Calls a callback, notifying hooks around the call.  Returns the start time and the
+        awaitable the callback returned, or None once its execution time has been recorded.
+        """
+        tokens = self._enter_hooks("callback", callback)
+        start = time.perf_counter()
+        try:
+            res = callback(*callback_args)
+        except Exception as exc:  # pylint: disable=broad-except
+            self._callback_finished(callback, start, tokens)
+            self._report_callback_error(callback, exc)
+            return start, None
+        if not inspect.isawaitable(res):
+            self._callback_finished(callback, start, tokens)
+            return start, None
+        self._exit_hooks("callback", callback, tokens)
+        if self._tci_hooks:
+            res = _HookedSteps(res, lambda: self._enter_hooks("callback", callback),
+                               lambda tokens: self._exit_hooks("callback", callback, tokens))
+        return start, res
+
+    async def _timed_callback(self, callback, res, start):
+        """Coroutine that awaits a coroutine callback and records its execution time to completion."""
+        try:
+            return await res
+        finally:
+            self._callback_finished(callback, start, ())
 
-            if expected_params == 0:
-                if cmd_info.name == "READY":
-                    self._ready_event.set()
-                for callback in self._get_param_listeners(cmd_info.name):
-                    self._schedule_callback(callback, cmd_info.name, None, None, None)
+    async def _dispatch_task_timed(self, callbacks, *callback_args):
+        """Like _dispatch_task, recording the execution time of each callback in metrics and notifying
+        hooks.
+        """
+        target = getattr(callback_args[0], "data_type", callback_args[0])
+        dispatch_tokens = self._enter_hooks("dispatch", target)
+        for callback in callbacks:
+            start, res = self._call_timed(callback, callback_args)
+            if res is None:
                 continue
+            task = asyncio.create_task(self._timed_callback(callback, res, start))
+            task.add_done_callback(lambda task: task.result())
+        self._exit_hooks("dispatch", target, dispatch_tokens)
 
-            if len(parts) != 2:
-                raise ValueError(f'Command {cmd_name} should have parameters, but none received.')
+    async def _dispatch_inline_timed(self, callbacks, *callback_args):
+        """Like _dispatch_inline, recording the execution time of each callback in metrics and
+        notifying hooks.
+        """
+        target = getattr(callback_args[0], "data_type", callback_args[0])
+        dispatch_tokens = self._enter_hooks("dispatch", target)
+        for callback in callbacks:
+            start, res = self._call_timed(callback, callback_args)
+            if res is None:
+                continue
+            try:
+                await self._timed_callback(callback, res, start)
+            except Exception as exc:  # pylint: disable=broad-except
+                self._report_callback_error(callback, exc)
+        self._exit_hooks("dispatch", target, dispatch_tokens)
+
+    def _decode_packet_timed(self, buf):
+        """Decodes a received data frame, recording the time taken in metrics and notifying hooks."""
+        tokens = self._enter_hooks("parse", "data")
+        start = time.perf_counter()
+        packet = tci.TciDataPacket.from_buf(buf, self.zero_copy)
+        if self.metrics is not None:
+            self.metrics.record_data(packet.data_type, len(buf), time.perf_counter() - start)
+        self._exit_hooks("parse", "data", tokens)
+        return packet
+
+    def _parse_params_timed(self, cmd_info, param_str):
+        """Decodes received parameters, recording the time taken in metrics and notifying hooks."""
+        tokens = self._enter_hooks("parse", cmd_info.name)
+        start = time.perf_counter()
+        res = cmd_info.parse_params(param_str)
+        if self.metrics is not None:
+            self.metrics.record_parse(time.perf_counter() - start)
+        self._exit_hooks("parse", cmd_info.name, tokens)
+        return res
 
-            cmd_params = [Listener._convert_type(v) for v in parts[1].split(",")]
-            param_cnt = len(cmd_params)
-            if expected_params not in (-1, param_cnt):
-                raise ValueError(f'Command {cmd_name} should have {expected_params} params, received {param_cnt}')
+    async def _listen_main(self, ws):
+        """Coroutine that receives from the server and schedules data/parameter callbacks."""
+        while True:
+            status = await ws.recv()
+            for callback in self._tci_frame_listeners:
+                callback(status)
 
-            param_rx = None
-            if cmd_info.has_rx:
-                param_rx = cmd_params.pop(0)
-                param_cnt -= 1
+            if isinstance(status, bytes):
+                if self._tci_instrumented:
+                    packet = self._decode_packet_timed(status)
+                else:
+                    packet = tci.TciDataPacket.from_buf(status, self.zero_copy)
+                await self._dispatch(self._get_data_listeners(packet.data_type, packet.rx), packet)
+                for stream in self._tci_blocking_streams:
+                    if stream.blocked:
+                        await stream.wait_room()
+                continue
 
-            param_sub_rx = None
-            if cmd_info.has_sub_rx:
-                param_sub_rx = cmd_params.pop(0)
-                param_cnt -= 1
+            for command in status.split(";"):
+                if command:
+                    await self._handle_command(command)
+
+    async def _handle_command(self, command):
+        """Coroutine that decodes a single received command (without its ";") and notifies callbacks."""
+        parts = command.split(":", 1)
+        cmd_name = parts[0].upper()
+        cmd_info = tci.COMMANDS.get(cmd_name)
+        if cmd_info is None:
+            raise ValueError(f'Command {cmd_name} unrecognized')
+        if self.metrics is not None:
+            self.metrics.record_command(cmd_info.name, len(command))
+
+        if cmd_info.name == "READY":
+            self._ready_event.set()
+        elif self._tci_replay and self._ready_event.is_set():
+            self._refresh_replay(cmd_info, command)
+
+        if not self._wants_param(cmd_info.name):
+            return
 
-            if param_cnt == 1:
-                cmd_params = cmd_params[0]
-            elif param_cnt == 0:
-                cmd_params = None
+        if cmd_info.total_params() == 0:
+            if self._tci_pending:
+                self._resolve_pending((cmd_info.name, None, None), None)
+            await self._dispatch(self._get_param_listeners(cmd_info.name), cmd_info.name, None, None, None)
+            return
 
-            for callback in self._get_param_listeners(cmd_info.name):
-                self._schedule_callback(callback, cmd_info.name, param_rx, param_sub_rx, cmd_params)
+        if len(parts) != 2:
+            raise ValueError(f'Command {cmd_name} should have parameters, but none received.')
+
+        if self._tci_instrumented:
+            param_rx, param_sub_rx, cmd_params = self._parse_params_timed(cmd_info, parts[1])
+        else:
+            param_rx, param_sub_rx, cmd_params = cmd_info.parse_params(parts[1])
+        if self._tci_pending:
+            self._resolve_pending((cmd_info.name, param_rx, param_sub_rx), cmd_params)
+        if self.state is not None and cmd_info.stateful:
+            changed = self.state.update(cmd_info.name, param_rx, param_sub_rx, cmd_params)
+            if self.changes_only and not changed:
+                return
+        await self._dispatch(self._get_param_listeners(cmd_info.name, param_rx, param_sub_rx), cmd_info.name, param_rx, param_sub_rx, cmd_params)
 
     async def _sender_main(self, ws):
         """Coroutine that sends commands and data packets to the server."""
+        if self.batch_commands:
+            get = self._tci_send.get_batch
+        else:
+            get = self._tci_send.get
         while True:
-            msg = await self._tci_send.get()
+            msg = await get()
             await ws.send(msg)
 
+    async def _run_connection(self):
+        """Coroutine that connects to the server and runs the listener/sender tasks until the connection ends."""
+        async with websockets.connect(self.uri) as ws:
+            listen_task = asyncio.create_task(self._listen_main(ws))
+            sender_task = asyncio.create_task(self._sender_main(ws))
+            resync_task = None
+            if self._disconnected_at is not None:
+                resync_task = asyncio.create_task(self._resync())
+            self._connected_event.set()
+            try:
+                await listen_task
+                await sender_task
+            finally:
+                listen_task.cancel()
+                sender_task.cancel()
+                if resync_task is not None:
+                    resync_task.cancel()
+
     async def _launch_tasks(self):
         """Coroutine that initiates connection and creates listener/sender tasks."""
         try:
-            async with websockets.connect(self.uri) as ws:
-                listen_task = asyncio.create_task(self._listen_main(ws))
-                sender_task = asyncio.create_task(self._sender_main(ws))
-                self._connected_event.set()
+            if not self.reconnect:
+                await self._run_connection()
+                return
+
+            delay = self.reconnect_delay
+            while True:
                 try:
-                    await listen_task
-                    await sender_task
-                except CancelledError:
-                    listen_task.cancel()
-                    sender_task.cancel()
+                    await self._run_connection()
+                except (OSError, asyncio.TimeoutError, WebSocketException):
+                    pass
+                if self._ready_event.is_set():
+                    delay = self.reconnect_delay
+                    self._disconnected_at = time.monotonic()
+                    self._ready_event.clear()
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.reconnect_max_delay)
         except CancelledError:
             pass
 
+    async def _resync(self):
+        """Coroutine that waits for the server to be ready after reconnecting and replays the stream
+        configuration, parameters and stream starts previously sent by this client.
+        """
+        await self._ready_event.wait()
+        self.reconnects += 1
+        self.last_ready_delay = time.monotonic() - self._disconnected_at
+        self.last_streaming_delay = None
+        if self.metrics is not None:
+            self.metrics.record_reconnect(self.last_ready_delay)
+        replay = self._tci_replay.items()
+        config = [msg for (name, _, _), msg in replay if name in _REPLAY_CONFIG]
+        params = [msg for (name, _, _), msg in replay if name not in _REPLAY_CONFIG and name not in _REPLAY_STREAMS]
+        streams = [msg for (name, _, _), msg in replay if name in _REPLAY_STREAMS]
+        for msg in config + params + streams:
+            self._tci_send.put_nowait(msg)
+        if streams:
+            self.add_data_listener("*", self._streaming_resumed)
+        else:
+            self._disconnected_at = None
+
+    def _streaming_resumed(self, _packet):
+        """Records the time taken to receive data again after reconnecting."""
+        self.remove_data_listener("*", self._streaming_resumed)
+        if self._disconnected_at is not None:
+            self.last_streaming_delay = time.monotonic() - self._disconnected_at
+            self._disconnected_at = None
+            if self.metrics is not None:
+                self.metrics.record_streaming_resumed(self.last_streaming_delay)
+
+    def _track_sent(self, message):
+        """Remembers writes and stream starts/stops in an outgoing message for replay after reconnecting."""
+        for command in message.split(";"):
+            cmd_info, fields = tci.split_command_string(command)
+            if cmd_info is None or not cmd_info.writeable:
+                continue
+            key = tci.command_state_key(cmd_info, fields)
+            name, rx, _ = key
+            if name in tci.STREAM_STOPS:
+                self._tci_replay.pop((tci.STREAM_STOPS[name], rx, None), None)
+            elif name in _REPLAY_STREAMS:
+                self._tci_replay[key] = command + ";"
+            elif (cmd_info.coalescible or name in _REPLAY_CONFIG) and len(fields) == cmd_info.total_params():
+                self._tci_replay[key] = command + ";"
+
+    def _refresh_replay(self, cmd_info, command):
+        """Replaces the replayed value of a parameter written by this client with an update received
+        from the server, so a reconnect re-applies the last known value rather than the last one sent.
+        The initial state sent before READY is ignored, as after a reconnect it may be the server's
+        defaults.
+        """
+        _, fields = tci.split_command_string(command)
+        key = tci.command_state_key(cmd_info, fields)
+        if key in self._tci_replay and key[0] not in _REPLAY_STREAMS and len(fields) == cmd_info.total_params():
+            self._tci_replay[key] = command + ";"
+
+    def packet_builder(self, rx, sample_rate, data_format, channels, max_samples, **builder_kwargs):
+        """Returns a TciPacketBuilder whose ring of buffers is large enough for every packet the send
+        queue can hold, so packets it builds are never overwritten while still waiting to be sent.
+        """
+        if not self.send_bulk_maxsize:
+            raise ValueError('Packet builders require a bounded send_bulk_maxsize')
+        builder_kwargs["buffers"] = self.send_bulk_maxsize + 2
+        return tci.TciPacketBuilder(rx, sample_rate, data_format, channels, max_samples, **builder_kwargs)
+
     async def send(self, data):
-        """Coroutine to enqueue data for sending, ensuring it reaches the queue."""
+        """Coroutine to enqueue data for sending, ensuring it reaches the queue.
+
+        Data packets are queued without copying, so a buffer passed in must not be modified until it
+        has been sent.  In particular, a memoryview returned by TciPacketBuilder.build() is overwritten
+        once the builder reuses that buffer; create builders with packet_builder() to size their ring
+        for the send queue.
+        """
+        if self.reconnect and isinstance(data, str):
+            self._track_sent(data)
         await self._tci_send.put(data)
 
     def send_nowait(self, data):
-        """Enqueue data for sending without ensuring it reaches the queue."""
+        """Enqueue data for sending without ensuring it reaches the queue.  Data packets are queued
+        without copying, as with send().
+        """
+        if self.reconnect and isinstance(data, str):
+            self._track_sent(data)
         self._tci_send.put_nowait(data)
 
+    async def _request(self, cmd_info, action, rx, sub_rx, params, check_params, timeout):
+        """Coroutine that sends a command and waits for the server to send back the same parameter."""
+        msg = cmd_info.prepare_string(action, rx=rx, sub_rx=sub_rx, params=params, check_params=check_params)
+        key = (cmd_info.name, int(rx) if cmd_info.has_rx else None, int(sub_rx) if cmd_info.has_sub_rx else None)
+        future = asyncio.get_running_loop().create_future()
+        self._add_pending(key, future)
+        try:
+            await self.send(msg)
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError as exc:
+            raise TimeoutError(f'Response to {cmd_info.name} not received after {timeout} sec.') from exc
+        finally:
+            self._remove_pending(key, future)
+
+    async def set(self, command, *params, rx=None, sub_rx=None, timeout=3.0, check_params=True):
+        """Coroutine that writes a parameter and waits for the server to acknowledge it.
+
+        Returns the acknowledged value, in the same form passed to parameter callbacks.  Boolean
+        parameters are sent as "true"/"false".  Several writes can be pipelined by awaiting them
+        together, e.g. with asyncio.gather or set_many, so they are acknowledged in one round trip.
+        """
+        cmd_info = tci.COMMANDS[command.upper()]
+        params = [str(p).lower() if isinstance(p, bool) else p for p in params]
+        return await self._request(cmd_info, tci.TciCommandSendAction.WRITE, rx, sub_rx, params, check_params, timeout)
+
+    async def get(self, command, *params, rx=None, sub_rx=None, timeout=3.0):
+        """Coroutine that requests the current value of a parameter and waits for the response."""
+        cmd_info = tci.COMMANDS[command.upper()]
+        return await self._request(cmd_info, tci.TciCommandSendAction.READ, rx, sub_rx, params, True, timeout)
+
+    async def set_many(self, settings, rx=None, sub_rx=None, timeout=3.0):
+        """Coroutine that writes several parameters at once and waits for all of them to be acknowledged.
+
+        The settings dict maps command names to a value, or to a tuple of values for commands with
+        several parameters.  Returns a dict of the acknowledged values by command name.
+        """
+        writes = [self.set(command, *(val if isinstance(val, tuple) else (val,)), rx=rx, sub_rx=sub_rx, timeout=timeout)
+                  for command, val in settings.items()]
+        return dict(zip(settings, await asyncio.gather(*writes)))
+
     async def start(self, timeout=3.0):
         """Coroutine called to start the connection and listener/sender tasks."""
         if self._launch_task is not None and not self._launch_task.done():
             return
-        self._tci_send = asyncio.Queue()
+        self._tci_send = SendQueue(coalesce=self.coalesce, bulk_maxsize=self.send_bulk_maxsize)
+        if self.metrics is not None:
+            self.metrics.send_queue = self._tci_send
         self._connected_event = asyncio.Event()
         self._ready_event = asyncio.Event()
         self._launch_task = asyncio.create_task(self._launch_tasks())
@@ -206,7 +694,14 @@ class Listener:
 
     def shutdown(self):
         """Cancels communication tasks and shut down connection."""
-        self._launch_task.cancel()
+        if self._launch_task is not None:
+            self._launch_task.cancel()
+        for stream in list(self._tci_streams):
+            stream.close()
+        for closeable in list(self._tci_closeables):
+            closeable.close()
+        for data_type, (callback, rx, _) in list(self._tci_offloaded):
+            self.remove_data_listener(data_type, callback, rx)
 
     async def ready(self, timeout=3.0):
         """Coroutine to verify initial synchronization is complete before continuing."""
@@ -0,0 +1,271 @@
+"""The metrics module contains the ListenerMetrics class used to measure where a Listener spends its
+time, and to expose those measurements as a dict or in the Prometheus text format.
+"""
+
+import asyncio
+from bisect import bisect_left
+import time
+
+# Upper bounds of the histogram buckets, in seconds.
+DEFAULT_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+
+def _callback_name(callback):
+    """Returns the name used to label measurements of a callback."""
+    # Wrappers such as functools.partial and ExecutorCallback are named after the callback they wrap.
+    while True:
+        inner = getattr(callback, "func", None) or getattr(callback, "callback", None)
+        if inner is None or not callable(inner):
+            break
+        callback = inner
+    if getattr(callback, "__qualname__", None) is None:
+        callback = type(callback)
+    name = callback.__qualname__
+    module = getattr(callback, "__module__", None)
+    return f'{module}.{name}' if module else name
+
+def _label(value):
+    """Escapes a string for use as a Prometheus label value."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+class Histogram:
+    """Histogram instances count observed durations into buckets with the given upper bounds, in
+    seconds, along with the total count and sum of all observations.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        """Records one observation."""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def snapshot(self):
+        """Returns the count, sum, mean and cumulative bucket counts as a dict."""
+        cumulative = []
+        total = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            cumulative.append((bound, total))
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "buckets": cumulative,
+        }
+
+class ListenerMetrics:
+    """ListenerMetrics instances hold the measurements of a Listener created with metrics enabled,
+    available as the listener's metrics attribute.
+
+    Received frames and bytes are counted per data stream type and per command, along with the time
+    spent decoding them.  The execution time of each registered callback is kept in a histogram,
+    measured from the call until any coroutine it returns completes, and labelled with the name given
+    to name_callback() or the callback's qualified name, numbered "#2" and so on where several
+    callbacks share a name, as lambdas do.  The depth and waiting time of
+    the send queue lanes are read from the listener's SendQueue once it has started.  With reconnect
+    enabled, reconnections are counted along with how long the last one took to become ready and to
+    receive data again.
+
+    snapshot() returns the measurements as a dict, prometheus() formats them in the Prometheus text
+    exposition format, and serve() starts a local HTTP endpoint answering with the latter.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.send_queue = None
+        self.callback_names = {}
+        self.reset()
+
+    def reset(self):
+        """Clears all measurements."""
+        self.started = time.monotonic()
+        self.data = {}
+        self.commands = {}
+        self.data_parse_time = Histogram(self.buckets)
+        self.command_parse_time = Histogram(self.buckets)
+        self.callback_time = {}
+        self._callback_hists = {}
+        self.reconnects = 0
+        self.last_ready_delay = None
+        self.last_streaming_delay = None
+
+    def record_data(self, data_type, size, parse_time):
+        """Records a received data frame of size bytes, decoded in parse_time seconds."""
+        counts = self.data.get(data_type)
+        if counts is None:
+            counts = self.data[data_type] = [0, 0]
+        counts[0] += 1
+        counts[1] += size
+        self.data_parse_time.observe(parse_time)
+
+    def record_command(self, name, size):
+        """Records a received command of size characters."""
+        counts = self.commands.get(name)
+        if counts is None:
+            counts = self.commands[name] = [0, 0]
+        counts[0] += 1
+        counts[1] += size
+
+    def record_parse(self, parse_time):
+        """Records the time taken to decode the parameters of a received command."""
+        self.command_parse_time.observe(parse_time)
+
+    def name_callback(self, callback, name):
+        """Labels the execution times of callback, as registered with the listener, with name."""
+        self.callback_names[callback] = name
+
+    def record_callback(self, callback, duration):
+        """Records the execution time of a callback."""
+        hist = self._callback_hists.get(callback)
+        if hist is None:
+            hist = self._callback_hists[callback] = Histogram(self.buckets)
+            name = self.callback_names.get(callback) or _callback_name(callback)
+            label = name
+            count = 1
+            while label in self.callback_time:
+                count += 1
+                label = f'{name}#{count}'
+            self.callback_time[label] = hist
+        hist.observe(duration)
+
+    def record_reconnect(self, ready_delay):
+        """Records a reconnection that became ready ready_delay seconds after the connection was lost."""
+        self.reconnects += 1
+        self.last_ready_delay = ready_delay
+        self.last_streaming_delay = None
+
+    def record_streaming_resumed(self, delay):
+        """Records that data was received again delay seconds after the connection was lost."""
+        self.last_streaming_delay = delay
+
+    def snapshot(self):
+        """Returns all measurements as a dict.  Rates are averaged since the metrics were reset."""
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+
+        def _rates(table):
+            return {
+                str(getattr(key, "name", key)): {
+                    "frames": frames,
+                    "bytes": size,
+                    "frames_per_sec": frames / elapsed,
+                    "bytes_per_sec": size / elapsed,
+                }
+                for key, (frames, size) in table.items()
+            }
+
+        res = {
+            "elapsed": elapsed,
+            "data": _rates(self.data),
+            "commands": _rates(self.commands),
+            "data_parse_time": self.data_parse_time.snapshot(),
+            "command_parse_time": self.command_parse_time.snapshot(),
+            "callback_time": {name: hist.snapshot() for name, hist in self.callback_time.items()},
+            "send": {},
+            "reconnect": {
+                "reconnects": self.reconnects,
+                "last_ready_delay": self.last_ready_delay,
+                "last_streaming_delay": self.last_streaming_delay,
+            },
+        }
+        if self.send_queue is not None:
+            for lane in (self.send_queue.control, self.send_queue.bulk):
+                res["send"][lane.name] = {
+                    "depth": lane.qsize(),
+                    "sent": lane.sent,
+                    "mean_delay": lane.mean_delay,
+                    "max_delay": lane.max_delay,
+                }
+        return res
+
+    def prometheus(self):
+        """Returns all measurements in the Prometheus text exposition format."""
+        lines = []
+
+        def _counter(name, help_text, label, table, index):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} counter')
+            for key, counts in table.items():
+                lines.append(f'{name}{{{label}="{_label(key)}"}} {counts[index]}')
+
+        def _histogram(name, help_text, hists):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} histogram')
+            for labels, hist in hists:
+                prefix = f'{labels},' if labels else ""
+                suffix = f'{{{labels}}}' if labels else ""
+                for bound, count in hist.snapshot()["buckets"]:
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f'{name}_bucket{{{prefix}le="{le}"}} {count}')
+                lines.append(f'{name}_sum{suffix} {hist.sum}')
+                lines.append(f'{name}_count{suffix} {hist.count}')
+
+        data = {getattr(key, "name", key): counts for key, counts in self.data.items()}
+        _counter("tci_data_frames_total", "Data frames received.", "type", data, 0)
+        _counter("tci_data_bytes_total", "Data frame bytes received.", "type", data, 1)
+        _counter("tci_commands_total", "Commands received.", "command", self.commands, 0)
+        _counter("tci_command_bytes_total", "Command characters received.", "command", self.commands, 1)
+        _histogram("tci_data_parse_seconds", "Time spent decoding data frames.", [("", self.data_parse_time)])
+        _histogram("tci_command_parse_seconds", "Time spent decoding command parameters.",
+                   [("", self.command_parse_time)])
+        _histogram("tci_callback_seconds", "Callback execution time.",
+                   [(f'callback="{_label(name)}"', hist) for name, hist in self.callback_time.items()])
+
+        if self.send_queue is not None:
+            lanes = (self.send_queue.control, self.send_queue.bulk)
+            for name, help_text, kind, value in (
+                    ("tci_send_queue_depth", "Messages waiting to be sent.", "gauge", lambda lane: lane.qsize()),
+                    ("tci_send_total", "Messages sent.", "counter", lambda lane: lane.sent),
+                    ("tci_send_delay_seconds_total", "Time messages waited before being sent.", "counter",
+                     lambda lane: lane.total_delay),
+                    ("tci_send_delay_seconds_max", "Longest time a message waited before being sent.", "gauge",
+                     lambda lane: lane.max_delay)):
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {kind}')
+                for lane in lanes:
+                    lines.append(f'{name}{{lane="{lane.name}"}} {value(lane)}')
+
+        lines.append('# HELP tci_reconnects_total Reconnections to the server.')
+        lines.append('# TYPE tci_reconnects_total counter')
+        lines.append(f'tci_reconnects_total {self.reconnects}')
+        for name, help_text, value in (
+                ("tci_reconnect_ready_seconds", "Time the last reconnection took to become ready.",
+                 self.last_ready_delay),
+                ("tci_reconnect_streaming_seconds", "Time the last reconnection took to receive data again.",
+                 self.last_streaming_delay)):
+            if value is not None:
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} gauge')
+                lines.append(f'{name} {value}')
+
+        return "\n".join(lines) + "\n"
+
+    async def serve(self, host="127.0.0.1", port=9108):
+        """Coroutine that starts a local HTTP endpoint answering every request with prometheus().
+        Returns the asyncio Server, which can be closed to stop the endpoint.
+        """
+        return await serve_prometheus(self.prometheus, host, port)
+
+async def serve_prometheus(render, host="127.0.0.1", port=9108):
+    """Coroutine that starts a local HTTP endpoint answering every request with the text returned by
+    render().  Returns the asyncio Server, which can be closed to stop the endpoint.
+    """
+    async def _handle(reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+            body = render().encode()
+            writer.write(b"HTTP/1.0 200 OK\r\n"
+                         b"Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                         + f'Content-Length: {len(body)}\r\n\r\n'.encode() + body)
+            await writer.drain()
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(_handle, host, port)
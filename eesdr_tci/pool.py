@@ -0,0 +1,206 @@
+"""The pool module contains the ListenerPool class used to drive several TCI servers from one event
+loop, with callbacks, streams, executors and metrics shared across the radios.
+"""
+
+import asyncio
+
+from .executor import ExecutorCallback
+from .listener import Listener
+from .metrics import _label, serve_prometheus
+
+class _RadioCallback:
+    """Calls a pool callback with the name of the radio prepended to the listener's arguments.
+    Instances wrapping the same callback for the same radio compare equal, so they can be removed.
+    """
+
+    __slots__ = ("callback", "radio")
+
+    def __init__(self, callback, radio):
+        self.callback = callback
+        self.radio = radio
+
+    def __call__(self, *args):
+        return self.callback(self.radio, *args)
+
+    def __eq__(self, other):
+        return isinstance(other, _RadioCallback) and self.callback == other.callback and self.radio == other.radio
+
+    def __hash__(self):
+        return hash((self.callback, self.radio))
+
+class MergedStream:
+    """MergedStream instances yield (radio, packet) tuples from the DataStreams of several radios
+    through async iteration, taking packets from the radios in turn while more than one has packets
+    buffered.  Iteration ends once every stream is closed.
+    """
+
+    def __init__(self, streams):
+        self.streams = dict(streams)
+        self._order = list(self.streams.items())
+        self._next = 0
+
+    def close(self):
+        """Closes the stream of every radio."""
+        for stream in self.streams.values():
+            stream.close()
+
+    @property
+    def received(self):
+        """Total number of packets accepted by the streams of all radios."""
+        return sum(stream.received for stream in self.streams.values())
+
+    @property
+    def dropped(self):
+        """Total number of packets dropped by the streams of all radios."""
+        return sum(stream.dropped for stream in self.streams.values())
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while self._order:
+            count = len(self._order)
+            for i in range(count):
+                idx = (self._next + i) % count
+                radio, stream = self._order[idx]
+                if stream.qsize():
+                    self._next = idx + 1
+                    return radio, await stream.__anext__()
+            self._order = [(radio, stream) for radio, stream in self._order if not stream.closed]
+            if not self._order:
+                break
+            waiters = [asyncio.ensure_future(stream.wait_packet()) for _, stream in self._order]
+            _, pending = await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+            for waiter in pending:
+                waiter.cancel()
+        raise StopAsyncIteration
+
+class ListenerPool:
+    """ListenerPool instances manage a Listener for each of several TCI servers from one event loop.
+
+    Radios are given as a dict of names to URIs, or a list of URIs used as their own names, and every
+    Listener is created with the same listener_kwargs, such as dispatch or metrics.  The listeners are
+    available by name through indexing and the listeners attribute.
+
+    Callbacks registered on the pool are registered on every radio, and receive the radio name before
+    the usual arguments.  Streams merge the packets of all radios, tagged by radio name.  Executors
+    requested by name are created once per pool and shared by every radio.
+    """
+
+    def __init__(self, uris, **listener_kwargs):
+        if not isinstance(uris, dict):
+            uris = {uri: uri for uri in uris}
+        self.listeners = {name: Listener(uri, **listener_kwargs) for name, uri in uris.items()}
+        self._executors = {}
+
+    def __getitem__(self, radio):
+        return self.listeners[radio]
+
+    def __iter__(self):
+        return iter(self.listeners)
+
+    def __len__(self):
+        return len(self.listeners)
+
+    def add_param_listener(self, param, callback, rx=None, sub_rx=None):
+        """Registers a parameter callback on every radio (see Listener.add_param_listener).
+
+        The callback signature is (radio, param_name, rx, sub_rx, params).
+        """
+        for radio, listener in self.listeners.items():
+            listener.add_param_listener(param, _RadioCallback(callback, radio), rx, sub_rx)
+
+    def remove_param_listener(self, param, callback, rx=None, sub_rx=None):
+        """Removes a parameter callback from every radio."""
+        for radio, listener in self.listeners.items():
+            listener.remove_param_listener(param, _RadioCallback(callback, radio), rx, sub_rx)
+
+    def add_data_listener(self, data_type, callback, rx=None, executor=None, max_inflight=4, on_result=None,
+                          max_workers=None):
+        """Registers a data callback on every radio (see Listener.add_data_listener).
+
+        The callback signature is (radio, packet).  If executor is "thread" or "process", a single
+        pool of max_workers is shared by every radio and every callback using that executor type, with
+        max_inflight applying to each radio separately.
+        """
+        if executor in ExecutorCallback.EXECUTOR_TYPES:
+            if executor not in self._executors:
+                self._executors[executor] = ExecutorCallback.EXECUTOR_TYPES[executor](max_workers=max_workers)
+            executor = self._executors[executor]
+        for radio, listener in self.listeners.items():
+            listener.add_data_listener(data_type, _RadioCallback(callback, radio), rx, executor, max_inflight,
+                                       on_result)
+
+    def remove_data_listener(self, data_type, callback, rx=None):
+        """Removes a data callback from every radio."""
+        for radio, listener in self.listeners.items():
+            listener.remove_data_listener(data_type, _RadioCallback(callback, radio), rx)
+
+    def stream(self, data_type, rx=None, maxsize=64, overflow="drop_oldest"):
+        """Returns a MergedStream yielding (radio, packet) tuples of data_type from every radio.
+
+        Each radio has its own DataStream buffering at most maxsize packets under the overflow policy
+        (see Listener.stream), so a "block" policy only holds back the radio whose stream is full.
+        """
+        return MergedStream((radio, listener.stream(data_type, rx, maxsize, overflow))
+                            for radio, listener in self.listeners.items())
+
+    async def start(self, timeout=3.0):
+        """Coroutine that starts every listener concurrently."""
+        await asyncio.gather(*(listener.start(timeout) for listener in self.listeners.values()))
+
+    async def ready(self, timeout=3.0):
+        """Coroutine that waits for every listener to be ready concurrently."""
+        await asyncio.gather(*(listener.ready(timeout) for listener in self.listeners.values()))
+
+    async def wait(self):
+        """Coroutine that waits until every listener's connection has ended."""
+        await asyncio.gather(*(listener.wait() for listener in self.listeners.values()))
+
+    def shutdown(self):
+        """Shuts down every listener and the shared executors."""
+        for listener in self.listeners.values():
+            listener.shutdown()
+        for executor in self._executors.values():
+            executor.shutdown(wait=False)
+        self._executors.clear()
+
+    async def send(self, data):
+        """Coroutine to enqueue data for sending to every radio."""
+        await asyncio.gather(*(listener.send(data) for listener in self.listeners.values()))
+
+    def metrics_snapshot(self):
+        """Returns the metrics snapshot of every radio created with metrics enabled, by radio name."""
+        return {radio: listener.metrics.snapshot() for radio, listener in self.listeners.items()
+                if listener.metrics is not None}
+
+    def prometheus(self):
+        """Returns the metrics of every radio in the Prometheus text exposition format, with a radio
+        label added to each sample.
+        """
+        families = {}
+        for radio, listener in self.listeners.items():
+            if listener.metrics is None:
+                continue
+            family = None
+            for line in listener.metrics.prometheus().splitlines():
+                if line.startswith("#"):
+                    family = families.setdefault(line.split(" ", 3)[2], [[], []])
+                    if len(family[0]) < 2:
+                        family[0].append(line)
+                    continue
+                name, value = line.rsplit(" ", 1)
+                label = f'radio="{_label(radio)}"'
+                if name.endswith("}"):
+                    name = name.replace("{", "{" + label + ",", 1)
+                else:
+                    name = f'{name}{{{label}}}'
+                family[1].append(f'{name} {value}')
+        lines = []
+        for comments, samples in families.values():
+            lines += comments + samples
+        return "\n".join(lines) + "\n"
+
+    async def serve_metrics(self, host="127.0.0.1", port=9108):
+        """Coroutine that starts a local HTTP endpoint answering every request with prometheus()."""
+        return await serve_prometheus(self.prometheus, host, port)
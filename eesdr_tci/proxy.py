@@ -0,0 +1,255 @@
+"""The proxy module contains the TciProxy class, a TCI server that shares a single connection to a
+radio between many local clients.
+"""
+
+import asyncio
+
+import websockets
+from websockets.exceptions import WebSocketException
+
+from . import tci
+from .listener import Listener
+from .sender import SendQueue
+
+# Stream start commands and the data streams each enables.
+_STREAM_STARTS = {
+    "IQ_START": (tci.TciStreamType.IQ_STREAM,),
+    "AUDIO_START": (tci.TciStreamType.RX_AUDIO_STREAM, tci.TciStreamType.TX_CHRONO),
+    "LINE_OUT_START": (tci.TciStreamType.RX_AUDIO_STREAM,),
+}
+
+# Commands keying the transmitter, which only one client may hold on at a time per receiver.
+_EXCLUSIVE = frozenset(("TRX", "TUNE"))
+
+# Commands setting the format of data streams, with the stream start commands whose streams they change.
+_STREAM_FORMATS = {
+    "IQ_SAMPLERATE": ("IQ_START",),
+    "AUDIO_SAMPLERATE": ("AUDIO_START", "LINE_OUT_START"),
+    "AUDIO_STREAM_SAMPLE_TYPE": ("AUDIO_START", "LINE_OUT_START"),
+    "AUDIO_STREAM_CHANNELS": ("AUDIO_START", "LINE_OUT_START"),
+    "AUDIO_STREAM_SAMPLES": ("AUDIO_START", "LINE_OUT_START"),
+}
+
+class _ProxyClient:
+    """Connection of a downstream client, with the streams it started and its outgoing queue.  A client
+    with text_maxsize command frames waiting is disconnected rather than buffering any further.
+    """
+
+    def __init__(self, ws, bulk_maxsize, text_maxsize):
+        self.ws = ws
+        self.subscriptions = set()
+        self.dropped = 0
+        self.stalled = False
+        self.text_maxsize = text_maxsize
+        self._queue = SendQueue(bulk_maxsize=bulk_maxsize)
+
+    def send_text(self, text):
+        if self.stalled:
+            return
+        if self.text_maxsize and self._queue.control.qsize() >= self.text_maxsize:
+            self.stalled = True
+            self.ws.transport.abort()
+            return
+        self._queue.put_nowait(text)
+
+    def send_data(self, frame):
+        try:
+            self._queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def sender_main(self):
+        while True:
+            await self.ws.send(await self._queue.get_batch())
+
+class TciProxy:
+    """TciProxy instances hold a single Listener connection to the TCI server at uri, and serve any
+    number of downstream TCI clients on host and port.  listener_kwargs are passed to the Listener,
+    for example reconnect=True to keep the upstream connection alive.
+
+    New clients are sent the initialization and state commands cached from the server followed by
+    READY as soon as they connect, without waiting on the radio; event commands that are not stateful
+    are not cached.  Parameter updates from the server are forwarded to every client, and reads are
+    answered from the cache when possible.  Data packets are
+    only forwarded to the clients that started that stream on that receiver; the stream is started
+    on the server when the first client starts it and stopped when the last client stops it or
+    disconnects.  At most client_bulk_maxsize data packets are queued for each client, and further
+    packets are dropped for that client while it falls behind.  A client falling behind by
+    client_text_maxsize command frames (unlimited if 0) is disconnected, as dropping parameter updates
+    would leave it with the wrong state; it receives the current state again when it reconnects.
+
+    Writes from all clients are sent to the server through the listener's send queue in the order
+    received.  TRX and TUNE are arbitrated: while one client holds them on for a receiver, other
+    clients' writes are refused and answered with the current state, and they are turned off if the
+    holding client disconnects.  Writes changing the sample rate, sample type, channels or packet size
+    of a stream are likewise refused while other clients are receiving that stream.
+    """
+
+    def __init__(self, uri, host="127.0.0.1", port=50002, client_bulk_maxsize=64, client_text_maxsize=1024,
+                 **listener_kwargs):
+        listener_kwargs.setdefault("zero_copy", True)
+        self.listener = Listener(uri, **listener_kwargs)
+        self.host = host
+        self.port = port
+        self.client_bulk_maxsize = client_bulk_maxsize
+        self.client_text_maxsize = client_text_maxsize
+        self._cache = {}
+        self._clients = set()
+        self._subscribers = {}
+        self._routes = {}
+        self._owners = {}
+        self._server = None
+        self.listener.add_frame_listener(self._upstream_frame)
+
+    @property
+    def clients(self):
+        """Number of connected downstream clients."""
+        return len(self._clients)
+
+    async def start(self, timeout=3.0):
+        """Coroutine that connects to the server, waits for it to be ready, then accepts clients."""
+        await self.listener.start(timeout)
+        await self.listener.ready(timeout)
+        self._server = await websockets.serve(self._serve_client, self.host, self.port)
+
+    async def wait(self):
+        """Coroutine that waits until the upstream connection has ended."""
+        await self.listener.wait()
+
+    def close(self):
+        """Stops accepting clients and shuts down the upstream connection."""
+        if self._server is not None:
+            self._server.close()
+        self.listener.shutdown()
+
+    def _upstream_frame(self, frame):
+        """Caches state commands received from the server and forwards frames to clients."""
+        if isinstance(frame, bytes):
+            packet = tci.TciDataPacket.from_buf(frame, True)
+            for client in self._routes.get((packet.data_type, packet.rx), ()):
+                client.send_data(frame)
+            return
+
+        forward = []
+        for command in frame.split(";"):
+            if not command:
+                continue
+            cmd_info, fields = tci.split_command_string(command)
+            if cmd_info is not None:
+                if cmd_info.name in _STREAM_STARTS or cmd_info.name in tci.STREAM_STOPS:
+                    continue
+                if cmd_info.stateful:
+                    self._cache[tci.command_state_key(cmd_info, fields)] = command + ";"
+            forward.append(command + ";")
+        if forward:
+            text = "".join(forward)
+            for client in self._clients:
+                client.send_text(text)
+
+    async def _serve_client(self, ws, *_):
+        """Coroutine handling a downstream client connection."""
+        client = _ProxyClient(ws, self.client_bulk_maxsize, self.client_text_maxsize)
+        client.send_text("".join(self._cache.values()) + "ready;")
+        self._clients.add(client)
+        sender_task = asyncio.create_task(client.sender_main())
+        try:
+            async for message in ws:
+                if isinstance(message, bytes):
+                    await self.listener.send(message)
+                    continue
+                for command in message.split(";"):
+                    if command:
+                        await self._client_command(client, command)
+        except WebSocketException:
+            pass
+        finally:
+            self._clients.discard(client)
+            sender_task.cancel()
+            await self._release(client)
+
+    async def _client_command(self, client, command):
+        """Coroutine that handles a single command from a client."""
+        cmd_info, fields = tci.split_command_string(command)
+        if cmd_info is None:
+            await self.listener.send(command + ";")
+            return
+        name = cmd_info.name
+
+        if name in _STREAM_STARTS or name in tci.STREAM_STOPS:
+            rx = fields[0] if fields else "0"
+            client.send_text(command + ";")
+            if name in _STREAM_STARTS:
+                await self._subscribe(client, (name, rx))
+            else:
+                await self._unsubscribe(client, (tci.STREAM_STOPS[name], rx))
+            return
+
+        key = tci.command_state_key(cmd_info, fields)
+        if len(fields) < cmd_info.total_params():
+            cached = self._cache.get(key)
+            if cached is not None:
+                client.send_text(cached)
+                return
+        elif name in _EXCLUSIVE and len(fields) > 1:
+            owner_key = (name, fields[0])
+            owner = self._owners.get(owner_key)
+            if owner is not None and owner is not client:
+                client.send_text(self._cache.get(key, f'{name.lower()}:{fields[0]},true;'))
+                return
+            if fields[1].lower() == "true":
+                self._owners[owner_key] = client
+            else:
+                self._owners.pop(owner_key, None)
+        elif name in _STREAM_FORMATS and self._streaming_others(client, _STREAM_FORMATS[name]):
+            cached = self._cache.get(key)
+            if cached is not None:
+                client.send_text(cached)
+            return
+        await self.listener.send(command + ";")
+
+    def _streaming_others(self, client, starts):
+        """Returns True if a client other than client receives a stream started by one of starts."""
+        return any(start in starts and subscribers - {client}
+                   for (start, _), subscribers in self._subscribers.items())
+
+    async def _subscribe(self, client, key):
+        """Coroutine adding a client to a stream, starting it on the server for the first client."""
+        if key in client.subscriptions:
+            return
+        client.subscriptions.add(key)
+        subscribers = self._subscribers.setdefault(key, set())
+        subscribers.add(client)
+        self._rebuild_routes()
+        if len(subscribers) == 1:
+            await self.listener.send(f'{key[0].lower()}:{key[1]};')
+
+    async def _unsubscribe(self, client, key):
+        """Coroutine removing a client from a stream, stopping it on the server after the last client."""
+        if key not in client.subscriptions:
+            return
+        client.subscriptions.discard(key)
+        subscribers = self._subscribers[key]
+        subscribers.discard(client)
+        self._rebuild_routes()
+        if not subscribers:
+            del self._subscribers[key]
+            stop = next(stop for stop, start in tci.STREAM_STOPS.items() if start == key[0])
+            await self.listener.send(f'{stop.lower()}:{key[1]};')
+
+    async def _release(self, client):
+        """Coroutine releasing the streams and transmitter held by a disconnected client."""
+        for key in list(client.subscriptions):
+            await self._unsubscribe(client, key)
+        for (name, rx), owner in list(self._owners.items()):
+            if owner is client:
+                del self._owners[(name, rx)]
+                await self.listener.send(f'{name.lower()}:{rx},false;')
+
+    def _rebuild_routes(self):
+        """Rebuilds the index of clients receiving each (data_type, rx) data stream."""
+        routes = {}
+        for (start, rx), subscribers in self._subscribers.items():
+            for data_type in _STREAM_STARTS[start]:
+                key = (data_type, int(rx))
+                routes[key] = routes.get(key, frozenset()) | subscribers
+        self._routes = {key: tuple(clients) for key, clients in routes.items()}
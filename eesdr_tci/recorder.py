@@ -0,0 +1,257 @@
+"""The recorder module contains the AudioRecorder class used to write received audio streams to WAV or
+raw files from a background thread, so a slow disk or pipe never blocks the event loop.
+"""
+
+from datetime import datetime
+import os
+import queue
+import struct
+import threading
+import time
+
+from . import tci
+
+_WAVE_FORMAT_PCM = 1
+_WAVE_FORMAT_IEEE_FLOAT = 3
+
+# RIFF header, fmt chunk and data chunk header of a WAV file, rewritten with the final sizes once the
+# file is complete.
+_WAV_HEADER = struct.Struct("<4sI4s4sIHHIIHH4sI")
+_WAV_MAX_SIZE = 0xFFFFFFFF
+
+def _wav_header(sample_rate, data_format, channels, data_size=0):
+    """Returns the 44-byte WAV header for data_size bytes of samples of the given format."""
+    sample_size = data_format.bytes_per_sample
+    format_tag = _WAVE_FORMAT_IEEE_FLOAT if data_format == tci.TciSampleType.FLOAT32 else _WAVE_FORMAT_PCM
+    return _WAV_HEADER.pack(b"RIFF", min(36 + data_size, _WAV_MAX_SIZE), b"WAVE", b"fmt ", 16, format_tag,
+                            channels, sample_rate, sample_rate * channels * sample_size,
+                            channels * sample_size, 8 * sample_size, b"data", min(data_size, _WAV_MAX_SIZE))
+
+class AudioRecorder:
+    """AudioRecorder instances write the samples of received audio packets to files on a dedicated
+    writer thread.  They are data callbacks, normally created with attach_audio_recorder(), and only
+    keep packets from receiver rx.
+
+    Packets are gathered into chunks of chunk_size bytes, which are handed to the writer thread through
+    a queue of at most max_chunks.  A chunk left waiting flush_interval seconds is taken and written
+    by the writer thread itself, so samples reach the file even after the stream stops.  When the
+    writer falls that far behind, or has failed with an OSError (kept in the error attribute), further
+    chunks are dropped, counted by the dropped counter in packets.
+
+    The file_format is "wav", writing a header matching the sample rate, sample type and channel count
+    of the stream, or "raw" for the bare interleaved samples.  The path is formatted with rx, index
+    (counting files from 0) and time (the local time the file was opened), e.g. "rx{rx}_{time}.wav".
+    A new file is started after rotate_bytes bytes or rotate_seconds seconds of samples, and whenever
+    the stream format changes in a WAV recording.  If path would give the new file the same name, the
+    index is added before its extension.  The names of the files written are kept in the files
+    attribute.
+    """
+
+    FILE_FORMATS = ("wav", "raw")
+
+    def __init__(self, path, rx=0, file_format="wav", chunk_size=1 << 20, max_chunks=16, flush_interval=1.0,
+                 rotate_bytes=None, rotate_seconds=None, on_close=None):
+        if file_format not in AudioRecorder.FILE_FORMATS:
+            raise ValueError(f'File format {file_format} unrecognized')
+        if max_chunks < 1:
+            raise ValueError('Recorder max_chunks must be at least 1')
+        self.path = path
+        self.rx = rx
+        self.file_format = file_format
+        self.chunk_size = chunk_size
+        self.flush_interval = flush_interval
+        self.rotate_bytes = rotate_bytes
+        self.rotate_seconds = rotate_seconds
+        self.received = 0
+        self.dropped = 0
+        self.bytes_written = 0
+        self.files = []
+        self.error = None
+        self._on_close = on_close
+        self._chunk = bytearray()
+        self._chunk_packets = 0
+        self._chunk_started = 0.0
+        self._format = None
+        self._queue = queue.Queue(max_chunks)
+        self._closed = False
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._writer_main, name="AudioRecorder", daemon=True)
+        self._thread.start()
+
+    def __call__(self, packet):
+        """Adds the samples of a received packet to the current chunk."""
+        if self._closed or packet.rx != self.rx or packet.data is None:
+            return
+        self.received += 1
+        fmt = (packet.sample_rate, packet.data_format, packet.channels)
+        with self._lock:
+            if fmt != self._format:
+                self._queue_chunk()
+                self._format = fmt
+            if not self._chunk:
+                self._chunk_started = time.monotonic()
+            self._chunk += packet.data
+            self._chunk_packets += 1
+            if len(self._chunk) >= self.chunk_size:
+                self._queue_chunk()
+
+    def _queue_chunk(self):
+        """Hands the current chunk to the writer thread, or drops it if the writer is behind.  Called
+        with the lock held.
+        """
+        if not self._chunk:
+            return
+        chunk, self._chunk = self._chunk, bytearray()
+        if self.error is None:
+            try:
+                self._queue.put_nowait((self._format, chunk))
+            except queue.Full:
+                self.dropped += self._chunk_packets
+        else:
+            self.dropped += self._chunk_packets
+        self._chunk_packets = 0
+
+    def _take_chunk(self, closing):
+        """Takes the current chunk for the writer thread if it has waited flush_interval seconds with
+        no queued chunk ahead of it, or unconditionally when closing.
+        """
+        with self._lock:
+            if not self._chunk:
+                return None
+            if not closing and (not self._queue.empty()
+                                or time.monotonic() - self._chunk_started < self.flush_interval):
+                return None
+            chunk, self._chunk = self._chunk, bytearray()
+            packets, self._chunk_packets = self._chunk_packets, 0
+            if self.error is not None:
+                self.dropped += packets
+                return None
+            return self._format, chunk
+
+    def close(self):
+        """Writes the remaining samples, waits for the writer thread and closes the current file."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._on_close is not None:
+            self._on_close(self)
+        self._queue.put(None)
+        self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def _writer_main(self):
+        """Writer thread writing queued chunks to files, rotating them as configured, and flushing the
+        current chunk once it has waited flush_interval seconds.
+        """
+        writer = _FileWriter(self)
+        try:
+            while True:
+                try:
+                    item = self._queue.get(timeout=self.flush_interval)
+                    closing = item is None
+                except queue.Empty:
+                    item = None
+                    closing = False
+                flushing = item is None
+                if flushing:
+                    item = self._take_chunk(closing)
+                if item is not None and self.error is None:
+                    try:
+                        writer.write(*item)
+                        if flushing:
+                            writer.flush()
+                    except OSError as exc:
+                        self.error = exc
+                if closing:
+                    break
+        finally:
+            try:
+                writer.close()
+            except OSError as exc:
+                self.error = self.error or exc
+
+class _FileWriter:
+    """State of the file being written by an AudioRecorder's writer thread."""
+
+    def __init__(self, recorder):
+        self.recorder = recorder
+        self.file = None
+        self.format = None
+        self.size = 0
+        self.limit = None
+
+    def write(self, fmt, data):
+        """Writes samples of format fmt, opening and rotating files as needed."""
+        if self.file is not None and fmt != self.format and self.recorder.file_format == "wav":
+            self.close()
+        self.format = fmt
+        data = memoryview(data)
+        while data:
+            if self.file is None:
+                self.open()
+            count = len(data) if self.limit is None else min(len(data), self.limit - self.size)
+            self.file.write(data[:count])
+            self.size += count
+            self.recorder.bytes_written += count
+            data = data[count:]
+            if self.limit is not None and self.size >= self.limit:
+                self.close()
+
+    def flush(self):
+        """Flushes the current file to the operating system."""
+        if self.file is not None:
+            self.file.flush()
+
+    def open(self):
+        """Opens the next file, writing a WAV header with placeholder sizes if needed."""
+        recorder = self.recorder
+        sample_rate, data_format, channels = self.format
+        frame_size = data_format.bytes_per_sample * channels
+        limits = []
+        if recorder.rotate_bytes:
+            limits.append(recorder.rotate_bytes)
+        if recorder.rotate_seconds:
+            limits.append(int(recorder.rotate_seconds * sample_rate) * frame_size)
+        if recorder.file_format == "wav":
+            limits.append(_WAV_MAX_SIZE - 36)
+        self.limit = max(frame_size, min(limits) // frame_size * frame_size) if limits else None
+        index = len(recorder.files)
+        name = recorder.path.format(rx=recorder.rx, index=index, time=datetime.now().strftime("%Y%m%d-%H%M%S"))
+        if name in recorder.files:
+            root, ext = os.path.splitext(name)
+            name = f'{root}-{index}{ext}'
+        self.file = open(name, "wb")  # pylint: disable=consider-using-with
+        recorder.files.append(name)
+        self.size = 0
+        if recorder.file_format == "wav":
+            self.file.write(_wav_header(sample_rate, data_format, channels))
+
+    def close(self):
+        """Closes the current file, patching the WAV header with the final sizes."""
+        if self.file is None:
+            return
+        file, self.file = self.file, None
+        try:
+            if self.recorder.file_format == "wav":
+                file.seek(0)
+                file.write(_wav_header(*self.format, self.size))
+        finally:
+            file.close()
+
+def attach_audio_recorder(listener, path, rx=0, file_format="wav", **recorder_kwargs):
+    """Returns an AudioRecorder writing the audio of receiver rx received by listener.  The recorder is
+    removed from the listener, and its last file completed, when closed or at listener shutdown.
+    """
+    def _on_close(recorder):
+        listener.remove_data_listener(tci.TciStreamType.RX_AUDIO_STREAM, recorder, rx)
+        listener.remove_closeable(recorder)
+
+    recorder = AudioRecorder(path, rx, file_format, on_close=_on_close, **recorder_kwargs)
+    listener.add_closeable(recorder)
+    listener.add_data_listener(tci.TciStreamType.RX_AUDIO_STREAM, recorder, rx)
+    return recorder
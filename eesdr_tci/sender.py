@@ -0,0 +1,151 @@
+"""The sender module contains the SendQueue class holding commands and data packets waiting to be
+sent to the TCI server.
+"""
+
+import asyncio
+from collections import deque
+import time
+
+from . import tci
+
+def _write_key(message):
+    """Returns the (name, rx, sub_rx) written by a coalescible command string, or None otherwise."""
+    if ";" in message.rstrip(";"):
+        return None
+    cmd_info, fields = tci.split_command_string(message)
+    if cmd_info is None or not cmd_info.coalescible or len(fields) != cmd_info.total_params():
+        return None
+    rx = fields[0] if cmd_info.has_rx else None
+    sub_rx = fields[1] if cmd_info.has_rx and cmd_info.has_sub_rx else None
+    return (cmd_info.name, rx, sub_rx)
+
+class SendLane:
+    """SendLane instances hold the messages of one priority level of a SendQueue, limited to maxsize
+    messages unless maxsize is 0.  The sent, total_delay and max_delay counters measure how long
+    messages waited in the lane before being handed to the sender, in seconds.
+    """
+
+    def __init__(self, name, maxsize=0):
+        self.name = name
+        self.maxsize = maxsize
+        self.sent = 0
+        self.total_delay = 0.0
+        self.max_delay = 0.0
+        self._items = deque()
+
+    @property
+    def mean_delay(self):
+        """Average time messages waited in the lane before being sent, in seconds."""
+        if self.sent == 0:
+            return 0.0
+        return self.total_delay / self.sent
+
+    def full(self):
+        """Returns True if the lane holds maxsize messages."""
+        return 0 < self.maxsize <= len(self._items)
+
+    def qsize(self):
+        """Returns the number of messages waiting in the lane."""
+        return len(self._items)
+
+    def _push(self, item):
+        self._items.append((time.monotonic(), item))
+
+    def _pop(self):
+        queued, item = self._items.popleft()
+        delay = time.monotonic() - queued
+        self.sent += 1
+        self.total_delay += delay
+        if delay > self.max_delay:
+            self.max_delay = delay
+        return item
+
+class SendQueue:
+    """SendQueue instances hold the command strings and data packets waiting to be sent by a Listener.
+
+    Command strings go into the control lane and data packets into the bulk lane, each kept in the
+    order queued.  The control lane is always emptied first, so a command such as an unkey waits
+    behind at most the one data packet already being sent.  The bulk lane holds at most bulk_maxsize
+    packets (unlimited if 0): put() waits for room and put_nowait() raises asyncio.QueueFull.
+
+    With coalesce enabled, a write to a coalescible command (see TciCommand) replaces any write to the
+    same command, receiver and sub-receiver that is still waiting to be sent.  The newest value is
+    sent in the position of the first pending write, and all other messages keep their order.  Any
+    other command string is a barrier: writes queued after it are never sent ahead of it, so a write
+    following one is queued as a new message.  The coalesced counter tracks the writes replaced.
+    """
+
+    def __init__(self, coalesce=False, bulk_maxsize=64):
+        self.coalesce = coalesce
+        self.coalesced = 0
+        self.control = SendLane("control")
+        self.bulk = SendLane("bulk", bulk_maxsize)
+        self._pending_writes = {}
+        self._not_empty = asyncio.Event()
+        self._bulk_not_full = asyncio.Event()
+
+    def put_nowait(self, data):
+        """Queues a command string or data packet for sending."""
+        if isinstance(data, str):
+            if self.coalesce:
+                key = _write_key(data)
+                if key is None:
+                    self._pending_writes.clear()
+                elif key in self._pending_writes:
+                    self._pending_writes[key][1] = data
+                    self.coalesced += 1
+                    return
+                else:
+                    data = self._pending_writes[key] = [key, data]
+            self.control._push(data)
+        else:
+            if self.bulk.full():
+                raise asyncio.QueueFull()
+            self.bulk._push(data)
+        self._not_empty.set()
+
+    async def put(self, data):
+        """Coroutine that queues a command string or data packet, waiting for room in the bulk lane."""
+        if not isinstance(data, str):
+            while self.bulk.full():
+                self._bulk_not_full.clear()
+                await self._bulk_not_full.wait()
+        self.put_nowait(data)
+
+    def _pop_control(self):
+        """Removes the next command string from the control lane."""
+        item = self.control._pop()
+        if isinstance(item, list):
+            key, data = item
+            if self._pending_writes.get(key) is item:
+                del self._pending_writes[key]
+            return data
+        return item
+
+    async def get(self):
+        """Coroutine that waits for and returns the next message to send, preferring the control lane."""
+        while True:
+            if self.control.qsize():
+                return self._pop_control()
+            if self.bulk.qsize():
+                item = self.bulk._pop()
+                self._bulk_not_full.set()
+                return item
+            self._not_empty.clear()
+            await self._not_empty.wait()
+
+    async def get_batch(self):
+        """Coroutine like get(), except that all queued command strings are returned joined together
+        as one string, each terminated by ";", so they can be sent in a single frame.
+        """
+        item = await self.get()
+        if not isinstance(item, str) or not self.control.qsize():
+            return item
+        commands = [item]
+        while self.control.qsize():
+            commands.append(self._pop_control())
+        return "".join(c if c.endswith(";") else c + ";" for c in commands)
+
+    def qsize(self):
+        """Returns the number of messages waiting to be sent."""
+        return self.control.qsize() + self.bulk.qsize()
@@ -0,0 +1,196 @@
+"""The session module contains the SessionRecorder and SessionReader classes used to capture the frames
+received from a TCI server to a file and read them back, so a session can be replayed through a
+Listener offline with replay().
+"""
+
+import asyncio
+import mmap
+import struct
+import time
+
+_MAGIC = b"TCISESS1"
+
+# File header: magic, wall clock time the file was created in ns.
+_FILE_HEADER = struct.Struct("<8sQ")
+
+# Record header: monotonic receive time in ns, payload length, payload kind.
+_RECORD_HEADER = struct.Struct("<QIB")
+
+_KIND_TEXT = 0
+_KIND_BINARY = 1
+_KIND_SESSION = 2
+
+class SessionRecorder:
+    """SessionRecorder instances append every frame they are called with to a session file, with the
+    monotonic time it was received.  Register one with Listener.add_frame_listener(), or create it
+    with attach_session_recorder(), to capture everything received from the server.
+
+    Records are appended to an existing session file, so several sessions can be captured into one.
+    Writes are buffered with a buffer of buffer_size bytes, and flushed when the recorder is closed.
+    """
+
+    def __init__(self, path, buffer_size=1 << 20, on_close=None):
+        self.path = path
+        self.frames = 0
+        self._on_close = on_close
+        self._file = open(path, "ab", buffering=buffer_size)  # pylint: disable=consider-using-with
+        if self._file.tell() == 0:
+            self._file.write(_FILE_HEADER.pack(_MAGIC, time.time_ns()))
+        else:
+            with open(path, "rb") as existing:
+                if existing.read(len(_MAGIC)) != _MAGIC:
+                    self._file.close()
+                    raise ValueError(f'{path} is not a TCI session file')
+        self._file.write(_RECORD_HEADER.pack(time.monotonic_ns(), 0, _KIND_SESSION))
+        self._pack = _RECORD_HEADER.pack
+        self._write = self._file.write
+
+    def __call__(self, frame):
+        """Appends a received frame to the file."""
+        if isinstance(frame, str):
+            frame = frame.encode()
+            kind = _KIND_TEXT
+        else:
+            kind = _KIND_BINARY
+        self._write(self._pack(time.monotonic_ns(), len(frame), kind))
+        self._write(frame)
+        self.frames += 1
+
+    @property
+    def closed(self):
+        """True once the recorder has been closed."""
+        return self._file.closed
+
+    def flush(self):
+        """Writes the buffered records to the file."""
+        self._file.flush()
+
+    def close(self):
+        """Flushes and closes the file."""
+        if self._file.closed:
+            return
+        if self._on_close is not None:
+            self._on_close(self)
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+class SessionReader:
+    """SessionReader instances read a session file written by SessionRecorder through mmap, so large
+    captures are paged in as they are read rather than loaded into memory.
+
+    Iterating over a reader yields (timestamp, frame) tuples, with timestamp the monotonic receive time
+    in ns and frame the received str or bytes.  A record cut short at the end of the file, as left by a
+    recorder that was not closed, ends the iteration.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as file:
+            size = file.seek(0, 2)
+            if size < _FILE_HEADER.size:
+                raise ValueError(f'{path} is not a TCI session file')
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.created_ns = _FILE_HEADER.unpack_from(self._map)
+        if magic != _MAGIC:
+            self._map.close()
+            raise ValueError(f'{path} is not a TCI session file')
+
+    def __iter__(self):
+        return ((timestamp, frame) for timestamp, frame in self._records() if frame is not None)
+
+    def _records(self):
+        """Yields (timestamp, frame) tuples for every record, with frame None where a session starts."""
+        buf = self._map
+        size = len(buf)
+        unpack = _RECORD_HEADER.unpack_from
+        header_size = _RECORD_HEADER.size
+        offset = _FILE_HEADER.size
+        while offset + header_size <= size:
+            timestamp, length, kind = unpack(buf, offset)
+            start = offset + header_size
+            offset = start + length
+            if offset > size:
+                break
+            if kind == _KIND_SESSION:
+                yield timestamp, None
+            elif kind == _KIND_TEXT:
+                yield timestamp, buf[start:offset].decode()
+            else:
+                yield timestamp, buf[start:offset]
+
+    def frames(self, speed=None):
+        """Async generator yielding the recorded frames paced by their timestamps, speed times faster
+        than they were received, or as fast as possible if speed is None.  Gaps between appended
+        sessions are skipped.
+        """
+        return _paced_frames(self._records(), speed)
+
+    def close(self):
+        """Unmaps the file."""
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+async def _paced_frames(records, speed):
+    """Async generator yielding the frames of (timestamp, frame) records paced at speed."""
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    elapsed = 0
+    last = None
+    for timestamp, frame in records:
+        if frame is None:
+            last = None
+            continue
+        if speed is not None:
+            if last is not None:
+                elapsed += timestamp - last
+            last = timestamp
+            delay = start + elapsed / 1e9 / speed - loop.time()
+            await asyncio.sleep(delay if delay > 0 else 0)
+        else:
+            await asyncio.sleep(0)
+        yield frame
+
+class _ReplaySocket:
+    """Stands in for the server connection of a Listener, receiving frames from a session file."""
+
+    def __init__(self, frames):
+        self._frames = frames
+
+    async def recv(self):
+        try:
+            return await self._frames.__anext__()
+        except StopAsyncIteration:
+            raise EOFError() from None
+
+def attach_session_recorder(listener, path, buffer_size=1 << 20):
+    """Returns a SessionRecorder appending every frame listener receives to the session file at path.
+    The recorder is removed from the listener when closed or at listener shutdown.
+    """
+    def _on_close(recorder):
+        listener.remove_frame_listener(recorder)
+        listener.remove_closeable(recorder)
+
+    recorder = SessionRecorder(path, buffer_size, on_close=_on_close)
+    listener.add_closeable(recorder)
+    listener.add_frame_listener(recorder)
+    return recorder
+
+async def replay(listener, path, speed=1.0):
+    """Coroutine that feeds the frames of a session file through the receive loop of listener in place
+    of a server connection, notifying its callbacks and streams as if they were received.
+
+    Frames are replayed at the pace they were recorded, speed times faster, or as fast as the
+    callbacks keep up if speed is None.  Returns once the whole file has been replayed.
+    """
+    with SessionReader(path) as reader:
+        await listener._feed(_ReplaySocket(reader.frames(speed)))  # pylint: disable=protected-access
@@ -0,0 +1,268 @@
+"""The shm module contains the SharedRing class used to share received samples with worker processes
+through a ring buffer in shared memory, without copying them for each consumer.
+"""
+
+from multiprocessing import resource_tracker, shared_memory
+import time
+
+from . import tci
+
+_MAGIC = 0x31474E4952494354  # b"TCIRING1" read as a little-endian uint64
+_HEADER_SIZE = 64
+
+# Indexes of the uint64 header fields.
+_H_MAGIC = 0
+_H_CAPACITY = 1
+_H_WRITE = 2
+_H_RESERVE = 3
+_H_SAMPLE_RATE = 4
+_H_DATA_FORMAT = 5
+_H_CHANNELS = 6
+_H_DATA_TYPE = 7
+
+def _attach(name):
+    """Attaches to an existing shared memory block without letting the resource tracker of this
+    process remove it on exit, which only the creating process should do.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        pass
+    # Before Python 3.13 attaching always registers the block with the resource tracker.  Processes
+    # started by multiprocessing share an already running tracker with the creating process, which
+    # must keep the registration; other processes start their own tracker and unregister.
+    tracker = getattr(resource_tracker, "_resource_tracker", None)
+    shared_tracker = getattr(tracker, "_fd", None) is not None
+    shm = shared_memory.SharedMemory(name=name)
+    if not shared_tracker:
+        resource_tracker.unregister(shm._name, "shared_memory")  # pylint: disable=protected-access
+    return shm
+
+class SharedRing:
+    """SharedRing instances hold a ring buffer of samples in a multiprocessing.shared_memory block.
+
+    A ring created with SharedRing.create() is the writer.  It is a data callback: registered with
+    Listener.add_data_listener(), or created with attach_shared_ring(), it copies the sample data of
+    each received packet straight into the ring and records the stream's sample rate, sample type and
+    channel count in the ring header.  Other processes open the ring by name with SharedRing.attach()
+    and read it through any number of RingReader cursors, each advancing independently.
+
+    The writer never waits for readers.  A reader that falls more than the ring size behind has its
+    unread samples overwritten; it detects this as an overrun and resumes from the newest data.
+    """
+
+    def __init__(self, shm, owner, on_close=None):
+        self._shm = shm
+        self._owner = owner
+        self._on_close = on_close
+        self._header = shm.buf[:_HEADER_SIZE].cast("Q")
+        if self._header[_H_MAGIC] != _MAGIC:
+            self._header.release()
+            raise ValueError(f'Shared memory {shm.name} does not hold a SharedRing')
+        self.capacity = self._header[_H_CAPACITY]
+        self._data = shm.buf[_HEADER_SIZE:_HEADER_SIZE + self.capacity]
+        self._closed = False
+
+    @classmethod
+    def create(cls, size=1 << 24, name=None, on_close=None):
+        """Creates a ring holding size bytes of samples in a new shared memory block, named name or
+        given a random name, which is removed when the ring is closed.
+        """
+        if size < 1:
+            raise ValueError('SharedRing size must be at least 1')
+        shm = shared_memory.SharedMemory(name=name, create=True, size=_HEADER_SIZE + size)
+        header = shm.buf[:_HEADER_SIZE].cast("Q")
+        header[_H_CAPACITY] = size
+        header[_H_MAGIC] = _MAGIC
+        header.release()
+        return cls(shm, True, on_close)
+
+    @classmethod
+    def attach(cls, name):
+        """Opens an existing ring created in another process."""
+        return cls(_attach(name), False)
+
+    @property
+    def name(self):
+        """Name of the shared memory block, passed to SharedRing.attach() by worker processes."""
+        return self._shm.name
+
+    @property
+    def write_pos(self):
+        """Total number of bytes written to the ring since it was created."""
+        return self._header[_H_WRITE]
+
+    @property
+    def sample_rate(self):
+        """Sample rate of the stream written to the ring."""
+        return self._header[_H_SAMPLE_RATE]
+
+    @property
+    def data_format(self):
+        """TciSampleType of the samples written to the ring."""
+        return tci.TciSampleType(self._header[_H_DATA_FORMAT])
+
+    @property
+    def data_type(self):
+        """TciStreamType of the stream written to the ring."""
+        return tci.TciStreamType(self._header[_H_DATA_TYPE])
+
+    @property
+    def channels(self):
+        """Number of channels of the samples written to the ring."""
+        return self._header[_H_CHANNELS] or 1
+
+    @property
+    def frame_size(self):
+        """Number of bytes used by one sample of every channel."""
+        return self.data_format.bytes_per_sample * self.channels
+
+    def __call__(self, packet):
+        """Writes the sample data of a received packet to the ring."""
+        if self._closed or packet.data is None:
+            return
+        header = self._header
+        header[_H_SAMPLE_RATE] = packet.sample_rate
+        header[_H_DATA_FORMAT] = packet.data_format
+        header[_H_CHANNELS] = packet.channels
+        header[_H_DATA_TYPE] = packet.data_type
+        self.write(packet.data)
+
+    def write(self, data):
+        """Writes raw sample bytes to the ring, overwriting the oldest data."""
+        data = memoryview(data).cast("B")
+        size = len(data)
+        capacity = self.capacity
+        if size > capacity:
+            data = data[size - capacity:]
+        header = self._header
+        pos = header[_H_WRITE]
+        # Readers treat everything up to the reserved position as possibly overwritten.
+        header[_H_RESERVE] = pos + size
+        count = len(data)
+        start = (pos + size - count) % capacity
+        first = min(count, capacity - start)
+        self._data[start:start + first] = data[:first]
+        if first < count:
+            self._data[:count - first] = data[first:]
+        header[_H_WRITE] = pos + size
+
+    def reader(self, start="latest"):
+        """Returns a RingReader whose cursor starts at the newest data ("latest") or at the oldest data
+        still held in the ring ("oldest").
+        """
+        return RingReader(self, start)
+
+    def close(self):
+        """Detaches from the shared memory, removing it if this ring created it."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._on_close is not None:
+            self._on_close(self)
+        self._header.release()
+        self._data.release()
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+class RingReader:
+    """RingReader instances read a SharedRing from their own cursor.  The overruns counter tracks how
+    often the reader fell behind far enough for unread data to be overwritten, and lost counts the
+    bytes skipped as a result.
+    """
+
+    def __init__(self, ring, start="latest"):
+        if start not in ("latest", "oldest"):
+            raise ValueError(f'Ring reader start {start} unrecognized')
+        self.ring = ring
+        self.overruns = 0
+        self.lost = 0
+        pos = ring.write_pos
+        self.cursor = pos if start == "latest" else max(0, pos - ring.capacity)
+
+    def available(self):
+        """Returns the number of bytes written since the cursor."""
+        return self.ring.write_pos - self.cursor
+
+    def _overrun(self):
+        pos = self.ring.write_pos
+        self.overruns += 1
+        self.lost += pos - self.cursor
+        self.cursor = pos
+
+    def read(self, max_bytes=None, align=1):
+        """Returns the bytes written since the cursor, up to max_bytes and rounded down to a multiple of
+        align, and advances the cursor.  Returns None if an overrun occurred, after moving the cursor
+        to the newest data.
+        """
+        ring = self.ring
+        header = ring._header  # pylint: disable=protected-access
+        capacity = ring.capacity
+        cursor = self.cursor
+        size = header[_H_WRITE] - cursor
+        if header[_H_RESERVE] - capacity > cursor:
+            self._overrun()
+            return None
+        if max_bytes is not None:
+            size = min(size, max_bytes)
+        size -= size % align
+        start = cursor % capacity
+        first = min(size, capacity - start)
+        data = ring._data[start:start + first].tobytes()  # pylint: disable=protected-access
+        if first < size:
+            data += ring._data[:size - first].tobytes()  # pylint: disable=protected-access
+        # The writer may have overwritten the data while it was being copied.
+        if header[_H_RESERVE] - capacity > cursor:
+            self._overrun()
+            return None
+        self.cursor = cursor + size
+        return data
+
+    def read_samples(self, max_frames=None):
+        """Returns the samples written since the cursor as a NumPy array of shape (frames, channels),
+        up to max_frames, using the format recorded by the writer (see TciDataPacket.samples()).
+        Returns None if an overrun occurred.  Requires NumPy.
+        """
+        ring = self.ring
+        frame_size = ring.frame_size
+        data = self.read(None if max_frames is None else max_frames * frame_size, frame_size)
+        if data is None:
+            return None
+        packet = tci.TciDataPacket(0, ring.sample_rate, ring.data_format, 0, 0,
+                                   len(data) // ring.data_format.bytes_per_sample,
+                                   ring.data_type, ring.channels, data)
+        return packet.samples()
+
+    def wait(self, min_bytes=1, timeout=None, poll=0.001):
+        """Waits until at least min_bytes are available, polling every poll seconds.  Returns False if
+        timeout seconds elapse first.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.available() < min_bytes:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(poll)
+        return True
+
+def attach_shared_ring(listener, data_type, rx=None, size=1 << 24, name=None):
+    """Returns a SharedRing into which the samples of data packets of data_type received by listener are
+    written, for worker processes to read through SharedRing.attach(ring.name).
+
+    Packets can be limited to a single receiver with rx.  The ring holds size bytes of samples and
+    is removed from the listener, and its shared memory released, when closed or at listener shutdown.
+    """
+    def _on_close(ring):
+        listener.remove_data_listener(data_type, ring, rx)
+        listener.remove_closeable(ring)
+
+    ring = SharedRing.create(size, name, on_close=_on_close)
+    listener.add_closeable(ring)
+    listener.add_data_listener(data_type, ring, rx)
+    return ring
@@ -0,0 +1,257 @@
+"""The sigmf module contains the IqCapture class used to archive received IQ streams as SigMF
+recordings, written through memory-mapped files with frequency changes recorded as metadata.
+"""
+
+from datetime import datetime, timezone
+import errno
+import json
+import mmap
+import os
+
+from . import tci
+
+SIGMF_VERSION = "1.0.0"
+
+# SigMF datatypes of the IQ samples written for each TciSampleType.  SigMF has no 24-bit type, so
+# INT24 samples are widened to 32 bits.
+_DATATYPES = {
+    tci.TciSampleType.INT16: "ci16_le",
+    tci.TciSampleType.INT24: "ci32_le",
+    tci.TciSampleType.INT32: "ci32_le",
+    tci.TciSampleType.FLOAT32: "cf32_le",
+}
+
+def _utc_now():
+    """Returns the current time in the ISO 8601 form used by SigMF."""
+    return datetime.now(timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+class _MappedFile:
+    """File written sequentially through a window of window_size bytes mapped into memory, extended
+    one window at a time and truncated to the bytes written when closed.
+    """
+
+    def __init__(self, path, window_size, preallocate=0):
+        granularity = mmap.ALLOCATIONGRANULARITY
+        self.window_size = max(granularity, window_size // granularity * granularity)
+        self.size = 0
+        self._file = open(path, "w+b")  # pylint: disable=consider-using-with
+        self._allocated = 0
+        if preallocate:
+            self._allocate(preallocate)
+        self._map = None
+        self._map_end = 0
+
+    def write(self, data):
+        """Copies data into the mapped window, moving the window forward when it fills."""
+        data = memoryview(data).cast("B")
+        while data:
+            if self.size == self._map_end:
+                self._next_window()
+            pos = self.size - self._map_end + self.window_size
+            count = min(len(data), self._map_end - self.size)
+            self._map[pos:pos + count] = data[:count]
+            self.size += count
+            data = data[count:]
+
+    def _next_window(self):
+        """Unmaps the full window and maps the next one, growing the file if needed."""
+        map_end = self.size + self.window_size
+        if map_end > self._allocated:
+            self._allocate(map_end)
+        if self._map is not None:
+            self._map.close()
+        self._map_end = map_end
+        self._map = mmap.mmap(self._file.fileno(), self.window_size, offset=self.size)
+
+    def _allocate(self, size):
+        """Extends the file to size bytes, reserving the disk space where the platform allows so a
+        full disk raises OSError here rather than a bus error on a later write through the mapping.
+        """
+        try:
+            os.posix_fallocate(self._file.fileno(), self._allocated, size - self._allocated)
+        except AttributeError:
+            self._file.truncate(size)
+        except OSError as exc:
+            if exc.errno not in (errno.EOPNOTSUPP, errno.EINVAL):
+                raise
+            self._file.truncate(size)
+        self._allocated = size
+
+    def close(self):
+        """Unmaps the window and truncates the file to the bytes written."""
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.truncate(self.size)
+        self._file.close()
+
+class IqCapture:
+    """IqCapture instances write the IQ stream of receiver rx to SigMF recordings.  They are data
+    callbacks, normally created with attach_iq_capture(), which also passes them DDS and
+    IQ_SAMPLERATE updates through on_param().
+
+    Samples are copied from each packet straight into a memory-mapped path.sigmf-data file, mapped
+    window_size bytes at a time so memory use stays bounded however long the capture runs.  The file
+    can be preallocated to preallocate bytes, and is truncated to the samples written when closed.
+    Disk space is reserved with posix_fallocate where available, so running out of space raises
+    OSError from the callback.
+
+    The path.sigmf-meta file describes the samples with their SigMF datatype and sample rate, and
+    is rewritten when the capture is closed or write_metadata() is called.  Each DDS change of the
+    receiver starts a new capture segment with its frequency, and each DDS or IQ_SAMPLERATE update is
+    also logged as an annotation, at the index of the next sample received.  Packets arriving with a
+    different sample rate or sample type end the recording and start a new one named path-1, path-2
+    and so on.  The base names of the recordings written are kept in the recordings attribute.
+    """
+
+    def __init__(self, path, rx=0, frequency=None, description=None, window_size=1 << 26, preallocate=0,
+                 on_close=None):
+        self.path = path
+        self.rx = rx
+        self.frequency = frequency
+        self.description = description
+        self.window_size = window_size
+        self.preallocate = preallocate
+        self.received = 0
+        self.recordings = []
+        self._on_close = on_close
+        self._format = None
+        self._data = None
+        self._sample_size = 0
+        self._captures = []
+        self._annotations = []
+        self._pending = []
+        self._closed = False
+
+    @property
+    def samples(self):
+        """Number of IQ samples written to the current recording."""
+        return self._data.size // self._sample_size if self._data is not None else 0
+
+    def __call__(self, packet):
+        """Writes the samples of a received IQ packet to the current recording."""
+        if self._closed or packet.rx != self.rx or packet.data is None:
+            return
+        fmt = (packet.sample_rate, packet.data_format)
+        if fmt != self._format:
+            self._start_recording(fmt)
+        if self._pending:
+            self._log_pending()
+        data = packet.data
+        if packet.data_format == tci.TciSampleType.INT24:
+            data = tci.widen_int24(data)
+        self._data.write(data)
+        self.received += 1
+
+    def on_param(self, name, rx, _sub_rx, params):
+        """Parameter callback logging DDS changes of the receiver and IQ_SAMPLERATE changes."""
+        if self._closed or (name == "DDS" and rx != self.rx):
+            return
+        self._pending.append((name, params, _utc_now()))
+        if self._data is not None and name == "DDS":
+            self._log_pending()
+
+    def _log_pending(self):
+        """Records the parameter updates received since the last packet at the current sample index."""
+        sample_start = self.samples
+        for name, value, when in self._pending:
+            if name == "DDS":
+                if value == self.frequency:
+                    continue
+                self.frequency = value
+                self._add_capture(sample_start, when)
+            self._annotations.append({
+                "core:sample_start": sample_start,
+                "core:label": name,
+                "core:comment": f'{name} {value}',
+            })
+        self._pending.clear()
+
+    def _add_capture(self, sample_start, when):
+        """Starts a capture segment at sample_start, replacing one already starting there."""
+        if self._captures and self._captures[-1]["core:sample_start"] == sample_start:
+            self._captures.pop()
+        capture = {"core:sample_start": sample_start, "core:datetime": when}
+        if self.frequency is not None:
+            capture["core:frequency"] = self.frequency
+        self._captures.append(capture)
+
+    def _start_recording(self, fmt):
+        """Ends the current recording and starts a new one for samples of format fmt."""
+        self._end_recording()
+        index = len(self.recordings)
+        base = self.path if index == 0 else f'{self.path}-{index}'
+        self.recordings.append(base)
+        self._format = fmt
+        sample_type = fmt[1]
+        self._sample_size = 2 * (4 if sample_type == tci.TciSampleType.INT24 else sample_type.bytes_per_sample)
+        self._data = _MappedFile(base + ".sigmf-data", self.window_size, self.preallocate)
+        self._captures = []
+        self._annotations = []
+        self._add_capture(0, _utc_now())
+        self.write_metadata()
+
+    def _end_recording(self):
+        """Closes the data file of the current recording and writes its final metadata."""
+        if self._data is None:
+            return
+        self._data.close()
+        self.write_metadata()
+        self._data = None
+
+    def metadata(self):
+        """Returns the SigMF metadata of the current recording as a dict."""
+        sample_rate, sample_type = self._format
+        global_info = {
+            "core:datatype": _DATATYPES[sample_type],
+            "core:sample_rate": sample_rate,
+            "core:version": SIGMF_VERSION,
+            "core:num_channels": 1,
+            "core:recorder": "eesdr-tci",
+        }
+        if self.description is not None:
+            global_info["core:description"] = self.description
+        return {"global": global_info, "captures": self._captures, "annotations": self._annotations}
+
+    def write_metadata(self):
+        """Writes the metadata of the current recording to its .sigmf-meta file."""
+        if self._format is None:
+            return
+        with open(self.recordings[-1] + ".sigmf-meta", "w", encoding="utf-8") as meta:
+            json.dump(self.metadata(), meta, indent=2)
+
+    def close(self):
+        """Completes the current recording, truncating its data file and writing its metadata."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._on_close is not None:
+            self._on_close(self)
+        self._end_recording()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+def attach_iq_capture(listener, path, rx=0, **capture_kwargs):
+    """Returns an IqCapture writing the IQ stream of receiver rx received by listener, with its DDS and
+    IQ_SAMPLERATE changes.  The starting frequency is taken from the listener state if tracked.  The
+    capture is removed from the listener, and its recording completed, when closed or at listener
+    shutdown.
+    """
+    def _on_close(capture):
+        listener.remove_data_listener(tci.TciStreamType.IQ_STREAM, capture, rx)
+        listener.remove_param_listener("DDS", capture.on_param, rx)
+        listener.remove_param_listener("IQ_SAMPLERATE", capture.on_param)
+        listener.remove_closeable(capture)
+
+    if listener.state is not None:
+        capture_kwargs.setdefault("frequency", listener.state.get("DDS", rx))
+    capture = IqCapture(path, rx, on_close=_on_close, **capture_kwargs)
+    listener.add_closeable(capture)
+    listener.add_param_listener("DDS", capture.on_param, rx)
+    listener.add_param_listener("IQ_SAMPLERATE", capture.on_param)
+    listener.add_data_listener(tci.TciStreamType.IQ_STREAM, capture, rx)
+    return capture
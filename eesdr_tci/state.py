@@ -0,0 +1,56 @@
+"""The state module contains the ParamState class used to keep the latest received parameter values."""
+
+_MISSING = object()
+
+class ParamState:
+    """ParamState instances hold the most recently received value of each parameter, keyed by
+    (command name, rx, sub_rx) with None used for receiver numbers that do not apply.  A Listener
+    created with track_state enabled keeps one updated as parameters are received.
+    """
+
+    def __init__(self):
+        self._values = {}
+
+    def update(self, name, rx, sub_rx, params):
+        """Stores a received value, returning True if it differs from the value already stored."""
+        key = (name, rx, sub_rx)
+        if self._values.get(key, _MISSING) == params:
+            return False
+        self._values[key] = params
+        return True
+
+    def get(self, name, rx=None, sub_rx=None, default=None):
+        """Returns the latest value received for a parameter, or default if none has been received."""
+        return self._values.get((name, rx, sub_rx), default)
+
+    def __contains__(self, key):
+        return key in self._values
+
+    def __len__(self):
+        return len(self._values)
+
+    def clear(self):
+        """Forgets all stored values."""
+        self._values.clear()
+
+    def snapshot(self):
+        """Returns a copy of all stored values as a dict keyed by (name, rx, sub_rx)."""
+        return {key: list(val) if isinstance(val, list) else val for key, val in self._values.items()}
+
+    def export(self):
+        """Returns the stored values as nested dicts suitable for serializing, grouping system
+        parameters under "system" and receiver parameters under "receivers" by receiver number, with
+        sub-receiver parameters under "channels" by sub-receiver number.
+        """
+        res = {"system": {}, "receivers": {}}
+        for (name, rx, sub_rx), val in self.snapshot().items():
+            if rx is None:
+                res["system"][name] = val
+                continue
+
+            receiver = res["receivers"].setdefault(rx, {"channels": {}})
+            if sub_rx is None:
+                receiver[name] = val
+            else:
+                receiver["channels"].setdefault(sub_rx, {})[name] = val
+        return res
@@ -0,0 +1,112 @@
+"""The stream module contains the DataStream class used to consume received data packets through
+asynchronous iteration rather than callbacks.
+"""
+
+import asyncio
+from collections import deque
+
+class DataStream:
+    """DataStream instances buffer received data packets of one stream type, optionally limited to a
+    single receiver, and yield them through async iteration.  They are normally created with
+    Listener.stream(), which registers the stream as a data listener for the given receiver.
+
+    At most maxsize packets are buffered.  When a packet arrives while the buffer is full, the
+    overflow policy decides what happens: "drop_oldest" discards the oldest buffered packet,
+    "drop_newest" discards the arriving packet, and "block" holds the arriving packet and suspends the
+    listener's receive loop until the consumer makes room.  The received and dropped counters track
+    the packets accepted and discarded by the stream.
+    """
+
+    OVERFLOW_POLICIES = ("drop_oldest", "drop_newest", "block")
+
+    def __init__(self, data_type, rx=None, maxsize=64, overflow="drop_oldest", on_close=None):
+        if overflow not in DataStream.OVERFLOW_POLICIES:
+            raise ValueError(f'Overflow policy {overflow} unrecognized')
+        if maxsize < 1:
+            raise ValueError('Stream maxsize must be at least 1')
+        self.data_type = data_type
+        self.rx = rx
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.received = 0
+        self.dropped = 0
+        self._packets = deque()
+        self._held = None
+        self._not_empty = asyncio.Event()
+        self._not_full = asyncio.Event()
+        self._closed = False
+        self._on_close = on_close
+
+    def __call__(self, packet):
+        """Accepts a packet from the listener, applying the overflow policy if the buffer is full."""
+        if self._closed:
+            return
+        self.received += 1
+        packets = self._packets
+        if len(packets) >= self.maxsize:
+            if self.overflow == "drop_newest":
+                self.dropped += 1
+                return
+            if self.overflow == "drop_oldest":
+                packets.popleft()
+                self.dropped += 1
+            else:
+                self._held = packet
+                return
+        packets.append(packet)
+        self._not_empty.set()
+
+    @property
+    def closed(self):
+        """True once the stream has been closed."""
+        return self._closed
+
+    @property
+    def blocked(self):
+        """True if a packet is being held until the consumer makes room under the "block" policy."""
+        return self._held is not None
+
+    async def wait_room(self):
+        """Coroutine that waits until a packet held under the "block" policy is added to the buffer."""
+        while self._held is not None:
+            if self._closed:
+                self._held = None
+                return
+            if len(self._packets) < self.maxsize:
+                self._packets.append(self._held)
+                self._held = None
+                self._not_empty.set()
+                return
+            self._not_full.clear()
+            await self._not_full.wait()
+
+    async def wait_packet(self):
+        """Coroutine that waits until a packet is buffered or the stream is closed."""
+        while not self._packets and not self._closed:
+            self._not_empty.clear()
+            await self._not_empty.wait()
+
+    def qsize(self):
+        """Returns the number of packets currently buffered."""
+        return len(self._packets)
+
+    def close(self):
+        """Stops the stream.  Buffered packets are still yielded before iteration ends."""
+        if self._closed:
+            return
+        self._closed = True
+        self._not_empty.set()
+        self._not_full.set()
+        if self._on_close is not None:
+            self._on_close(self)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        await self.wait_packet()
+        if not self._packets:
+            raise StopAsyncIteration
+        packet = self._packets.popleft()
+        self._not_full.set()
+        return packet
@@ -3,23 +3,119 @@ with TCI audio and data streams.
 """
 
 from enum import IntEnum
+from functools import lru_cache
 import struct
 
+def _convert_auto(val):
+    """Converts a string to int, float, or bool if possible, but returning the string if not."""
+    try:
+        return int(val)
+    except (ValueError, TypeError):
+        pass
+
+    try:
+        return float(val)
+    except (ValueError, TypeError):
+        pass
+
+    if val.upper() == "TRUE":
+        return True
+    if val.upper() == "FALSE":
+        return False
+
+    return val
+
+def _convert_int(val):
+    """Converts a string expected to hold an integer, falling back to automatic conversion."""
+    try:
+        return int(val)
+    except ValueError:
+        return _convert_auto(val)
+
+def _convert_float(val):
+    """Converts a string expected to hold a float, falling back to automatic conversion."""
+    try:
+        return float(val)
+    except ValueError:
+        return _convert_auto(val)
+
+_BOOL_VALUES = {"true": True, "false": False}
+
+def _convert_bool(val):
+    """Converts a string expected to hold a boolean, falling back to automatic conversion."""
+    res = _BOOL_VALUES.get(val)
+    if res is None:
+        res = _BOOL_VALUES.get(val.lower())
+        if res is None:
+            return _convert_auto(val)
+    return res
+
+def _convert_str(val):
+    """Leaves a string parameter as received."""
+    return val
+
+_CONVERTERS = {
+    "a": _convert_auto,
+    "i": _convert_int,
+    "f": _convert_float,
+    "b": _convert_bool,
+    "s": _convert_str,
+}
+
 class TciCommand:
     """TciCommand instances define the individual commands that can be sent to or received from a
     TCI server and are used to check parameters and produce command strings.  The COMMANDS dict
     contains preconfigured TciCommand instances for currently-known commands retrievable by their
     name as key.
+
+    The param_types string gives the type of each parameter following any receiver/sub-receiver
+    numbers, one character per parameter: "i" int, "f" float, "b" bool, "s" string, or "a" to try
+    each conversion in turn.  Commands with a variable number of parameters (param_count = -1) use a
+    single character applied to every parameter.  The types are compiled into a parse plan used when
+    decoding received command strings.
+
+    Coalescible commands set a state where only the latest value written matters, so pending writes
+    to the same receiver/sub-receiver may be merged before sending.  By default these are the
+    readable and writeable commands with parameters.
+
+    Commands that are not stateful report one-off events, such as a click on a spot, rather than a
+    value that persists until changed, so each one received is meaningful even if it repeats the last.
     """
 
     def __init__(self, name, readable = True, writeable = True,
-                 has_rx = False, has_sub_rx = False, param_count = 1):
+                 has_rx = False, has_sub_rx = False, param_count = 1, param_types = None,
+                 coalescible = None, stateful = True):
         self.name = name
+        self.stateful = stateful
         self.readable = readable
         self.writeable = writeable
         self.has_rx = has_rx
         self.has_sub_rx = has_sub_rx
         self.param_count = param_count
+        if coalescible is None:
+            coalescible = readable and writeable and param_count > 0
+        self.coalescible = coalescible
+        if param_types is None:
+            param_types = "a" * max(param_count, 1)
+        self.param_types = param_types
+        self._compile_parse_plan()
+
+    def _compile_parse_plan(self):
+        """Builds the tuple of per-field converters used by parse_params."""
+        prefix = []
+        if self.has_rx:
+            prefix += [_convert_int]
+        if self.has_sub_rx:
+            prefix += [_convert_int]
+        self._prefix_count = len(prefix)
+        if self.param_count == -1:
+            self._parse_plan = tuple(prefix)
+            self._variadic_converter = _CONVERTERS[self.param_types[0]]
+        else:
+            if len(self.param_types) < self.param_count:
+                raise ValueError(f"Command {self.name} requires {self.param_count} parameter types.")
+            self._parse_plan = tuple(prefix + [_CONVERTERS[t] for t in self.param_types[:self.param_count]])
+            self._variadic_converter = None
 
     def total_params(self):
         """Return the total number of parameters that should be present in a command string."""
@@ -76,125 +172,186 @@ class TciCommand:
         param_str = ",".join(cmd_params)
         return f"{uc_command}:{param_str};"
 
+    def parse_params(self, param_str):
+        """Decodes the parameter portion of a received command string using the compiled parse plan.
+
+        Returns a tuple of (rx, sub_rx, params) where rx and sub_rx are None if not applicable and
+        params is None, a single value, or a list of values depending on the parameters received.
+        """
+        fields = param_str.split(",")
+        param_cnt = len(fields)
+        plan = self._parse_plan
+
+        if self._variadic_converter is None:
+            if param_cnt != len(plan):
+                raise ValueError(f'Command {self.name} should have {len(plan)} params, received {param_cnt}')
+            vals = [convert(field) for convert, field in zip(plan, fields)]
+        else:
+            convert = self._variadic_converter
+            vals = [convert(field) for field in fields]
+            for i, prefix_convert in enumerate(plan):
+                vals[i] = prefix_convert(fields[i])
+
+        param_rx = None
+        param_sub_rx = None
+        prefix_count = self._prefix_count
+        if prefix_count:
+            if self.has_rx:
+                param_rx = vals[0]
+                if self.has_sub_rx:
+                    param_sub_rx = vals[1]
+            else:
+                param_sub_rx = vals[0]
+            del vals[:prefix_count]
+
+        param_cnt = len(vals)
+        if param_cnt == 1:
+            return param_rx, param_sub_rx, vals[0]
+        if param_cnt == 0:
+            return param_rx, param_sub_rx, None
+        return param_rx, param_sub_rx, vals
+
 COMMANDS = {cmd.name: cmd for cmd in [
     # Initialization Type Commands - TCI Protocol 2.0 - Section 4.1
     # All these should be readable = False, writeable = False
-    TciCommand("VFO_LIMITS",              readable = False, writeable = False, param_count = 2),
-    TciCommand("IF_LIMITS",               readable = False, writeable = False, param_count = 2),
-    TciCommand("TRX_COUNT",               readable = False, writeable = False),
-    TciCommand("CHANNELS_COUNT",          readable = False, writeable = False),
-    TciCommand("DEVICE",                  readable = False, writeable = False),
-    TciCommand("RECEIVE_ONLY",            readable = False, writeable = False),
-    TciCommand("MODULATIONS_LIST",        readable = False, writeable = False, param_count = -1),
-    TciCommand("PROTOCOL",                readable = False, writeable = False, param_count = 2),
-    TciCommand("READY",                   readable = False, writeable = False, param_count = 0),
+    TciCommand("VFO_LIMITS",              readable = False, writeable = False, param_count = 2, param_types = "ii"),
+    TciCommand("IF_LIMITS",               readable = False, writeable = False, param_count = 2, param_types = "ii"),
+    TciCommand("TRX_COUNT",               readable = False, writeable = False, param_types = "i"),
+    TciCommand("CHANNELS_COUNT",          readable = False, writeable = False, param_types = "i"),
+    TciCommand("DEVICE",                  readable = False, writeable = False, param_types = "s"),
+    TciCommand("RECEIVE_ONLY",            readable = False, writeable = False, param_types = "b"),
+    TciCommand("MODULATIONS_LIST",        readable = False, writeable = False, param_count = -1, param_types = "s"),
+    TciCommand("PROTOCOL",                readable = False, writeable = False, param_count = 2, param_types = "sa"),
+    TciCommand("READY",                   readable = False, writeable = False, param_count = 0, stateful = False),
     # Bidirectional Control Commands - TCI Protocol 2.0 - Section 4.2
     # All these should be readable = True, writeable = True
     TciCommand("START",                   readable = False, param_count = 0),
     TciCommand("STOP",                    readable = False, param_count = 0),
-    TciCommand("DDS",                     has_rx = True),
-    TciCommand("IF",                      has_rx = True, has_sub_rx = True),
-    TciCommand("VFO",                     has_rx = True, has_sub_rx = True),
-    TciCommand("MODULATION",              has_rx = True),
-    TciCommand("TRX",                     has_rx = True), # has optional parameter for TCI audio only for sending
-    TciCommand("TUNE",                    has_rx = True),
-    TciCommand("DRIVE",                   has_rx = True),
-    TciCommand("TUNE_DRIVE",              has_rx = True),
-    TciCommand("RIT_ENABLE",              has_rx = True),
-    TciCommand("XIT_ENABLE",              has_rx = True),
-    TciCommand("SPLIT_ENABLE",            has_rx = True),
-    TciCommand("RIT_OFFSET",              has_rx = True),
-    TciCommand("XIT_OFFSET",              has_rx = True),
-    TciCommand("RX_CHANNEL_ENABLE",       has_rx = True, has_sub_rx = True),
-    TciCommand("RX_FILTER_BAND",          has_rx = True, param_count = 2),
-    TciCommand("CW_MACROS_SPEED"),
-    TciCommand("CW_MACROS_DELAY"),
-    TciCommand("CW_KEYER_SPEED"),
-    TciCommand("VOLUME"),
-    TciCommand("MUTE"),
-    TciCommand("RX_MUTE",                 has_rx = True),
-    TciCommand("RX_VOLUME",               has_rx = True, has_sub_rx = True),
-    TciCommand("RX_BALANCE",              has_rx = True, has_sub_rx = True),
-    TciCommand("MON_VOLUME"),
-    TciCommand("MON_ENABLE"),
-    TciCommand("AGC_MODE",                has_rx = True),
-    TciCommand("AGC_GAIN",                has_rx = True),
-    TciCommand("RX_NB_ENABLE",            has_rx = True),
-    TciCommand("RX_NB_PARAM",             has_rx = True, param_count = 2),
-    TciCommand("RX_BIN_ENABLE",           has_rx = True),
-    TciCommand("RX_NR_ENABLE",            has_rx = True),
-    TciCommand("RX_ANC_ENABLE",           has_rx = True),
-    TciCommand("RX_ANF_ENABLE",           has_rx = True),
-    TciCommand("RX_APF_ENABLE",           has_rx = True),
-    TciCommand("RX_DSE_ENABLE",           has_rx = True),
-    TciCommand("RX_NF_ENABLE",            has_rx = True),
-    TciCommand("LOCK",                    has_rx = True),
-    TciCommand("SQL_ENABLE",              has_rx = True),
-    TciCommand("SQL_LEVEL",               has_rx = True),
-    TciCommand("DIGL_OFFSET"),
-    TciCommand("DIGU_OFFSET"),
+    TciCommand("DDS",                     has_rx = True, param_types = "i"),
+    TciCommand("IF",                      has_rx = True, has_sub_rx = True, param_types = "i"),
+    TciCommand("VFO",                     has_rx = True, has_sub_rx = True, param_types = "i"),
+    TciCommand("MODULATION",              has_rx = True, param_types = "s"),
+    TciCommand("TRX",                     has_rx = True, param_types = "b", coalescible = False), # has optional parameter for TCI audio only for sending
+    TciCommand("TUNE",                    has_rx = True, param_types = "b", coalescible = False),
+    TciCommand("DRIVE",                   has_rx = True, param_types = "i"),
+    TciCommand("TUNE_DRIVE",              has_rx = True, param_types = "i"),
+    TciCommand("RIT_ENABLE",              has_rx = True, param_types = "b"),
+    TciCommand("XIT_ENABLE",              has_rx = True, param_types = "b"),
+    TciCommand("SPLIT_ENABLE",            has_rx = True, param_types = "b"),
+    TciCommand("RIT_OFFSET",              has_rx = True, param_types = "i"),
+    TciCommand("XIT_OFFSET",              has_rx = True, param_types = "i"),
+    TciCommand("RX_CHANNEL_ENABLE",       has_rx = True, has_sub_rx = True, param_types = "b"),
+    TciCommand("RX_FILTER_BAND",          has_rx = True, param_count = 2, param_types = "ii"),
+    TciCommand("CW_MACROS_SPEED",         param_types = "i"),
+    TciCommand("CW_MACROS_DELAY",         param_types = "i"),
+    TciCommand("CW_KEYER_SPEED",          param_types = "i"),
+    TciCommand("VOLUME",                  param_types = "i"),
+    TciCommand("MUTE",                    param_types = "b"),
+    TciCommand("RX_MUTE",                 has_rx = True, param_types = "b"),
+    TciCommand("RX_VOLUME",               has_rx = True, has_sub_rx = True, param_types = "i"),
+    TciCommand("RX_BALANCE",              has_rx = True, has_sub_rx = True, param_types = "i"),
+    TciCommand("MON_VOLUME",              param_types = "i"),
+    TciCommand("MON_ENABLE",              param_types = "b"),
+    TciCommand("AGC_MODE",                has_rx = True, param_types = "s"),
+    TciCommand("AGC_GAIN",                has_rx = True, param_types = "i"),
+    TciCommand("RX_NB_ENABLE",            has_rx = True, param_types = "b"),
+    TciCommand("RX_NB_PARAM",             has_rx = True, param_count = 2, param_types = "ii"),
+    TciCommand("RX_BIN_ENABLE",           has_rx = True, param_types = "b"),
+    TciCommand("RX_NR_ENABLE",            has_rx = True, param_types = "b"),
+    TciCommand("RX_ANC_ENABLE",           has_rx = True, param_types = "b"),
+    TciCommand("RX_ANF_ENABLE",           has_rx = True, param_types = "b"),
+    TciCommand("RX_APF_ENABLE",           has_rx = True, param_types = "b"),
+    TciCommand("RX_DSE_ENABLE",           has_rx = True, param_types = "b"),
+    TciCommand("RX_NF_ENABLE",            has_rx = True, param_types = "b"),
+    TciCommand("LOCK",                    has_rx = True, param_types = "b"),
+    TciCommand("SQL_ENABLE",              has_rx = True, param_types = "b"),
+    TciCommand("SQL_LEVEL",               has_rx = True, param_types = "i"),
+    TciCommand("DIGL_OFFSET",             param_types = "i"),
+    TciCommand("DIGU_OFFSET",             param_types = "i"),
     # Unidirectional Control Commands - TCI Protocol 2.0 - Section 4.3
     # All these should be readable = False, writeable = True/False depending on semantics
-    TciCommand("TX_ENABLE",               readable = False, writeable = False, has_rx = True),
-    TciCommand("CW_MACROS_SPEED_UP",      readable = False),
-    TciCommand("CW_MACROS_SPEED_DOWN",    readable = False),
-    TciCommand("SPOT",                    readable = False, param_count = 5),
-    TciCommand("SPOT_DELETE",             readable = False),
-    TciCommand("IQ_SAMPLERATE",           readable = False),
-    TciCommand("AUDIO_SAMPLERATE",        readable = False),
+    TciCommand("TX_ENABLE",               readable = False, writeable = False, has_rx = True, param_types = "b"),
+    TciCommand("CW_MACROS_SPEED_UP",      readable = False, param_types = "i", stateful = False),
+    TciCommand("CW_MACROS_SPEED_DOWN",    readable = False, param_types = "i", stateful = False),
+    TciCommand("SPOT",                    readable = False, param_count = 5, param_types = "ssiis", stateful = False),
+    TciCommand("SPOT_DELETE",             readable = False, param_types = "s", stateful = False),
+    TciCommand("IQ_SAMPLERATE",           readable = False, param_types = "i"),
+    TciCommand("AUDIO_SAMPLERATE",        readable = False, param_types = "i"),
     TciCommand("IQ_START",                readable = False, has_rx = True, param_count = 0),
     TciCommand("IQ_STOP",                 readable = False, has_rx = True, param_count = 0),
     TciCommand("AUDIO_START",             readable = False, has_rx = True, param_count = 0),
     TciCommand("AUDIO_STOP",              readable = False, has_rx = True, param_count = 0),
     TciCommand("LINE_OUT_START",          readable = False, has_rx = True, param_count = 0),
     TciCommand("LINE_OUT_STOP",           readable = False, has_rx = True, param_count = 0),
-    TciCommand("LINE_OUT_RECORDER_START", readable = False, has_rx = True),
-    TciCommand("LINE_OUT_RECORDER_SAVE",  readable = False, has_rx = True),
-    TciCommand("LINE_OUT_RECORDER_BREAK", readable = False, has_rx = True, param_count = 0),
-    TciCommand("SPOT_CLEAR",              readable = False, param_count = 0),
-    TciCommand("AUDIO_STREAM_SAMPLE_TYPE",readable = False),
-    TciCommand("AUDIO_STREAM_CHANNELS",   readable = False),
-    TciCommand("AUDIO_STREAM_SAMPLES",    readable = False),
-    TciCommand("TX_STREAM_AUDIO_BUFFERING", readable = False),
+    TciCommand("LINE_OUT_RECORDER_START", readable = False, has_rx = True, param_types = "i", stateful = False),
+    TciCommand("LINE_OUT_RECORDER_SAVE",  readable = False, has_rx = True, param_types = "s", stateful = False),
+    TciCommand("LINE_OUT_RECORDER_BREAK", readable = False, has_rx = True, param_count = 0, stateful = False),
+    TciCommand("SPOT_CLEAR",              readable = False, param_count = 0, stateful = False),
+    TciCommand("AUDIO_STREAM_SAMPLE_TYPE",readable = False, param_types = "s"),
+    TciCommand("AUDIO_STREAM_CHANNELS",   readable = False, param_types = "i"),
+    TciCommand("AUDIO_STREAM_SAMPLES",    readable = False, param_types = "i"),
+    TciCommand("TX_STREAM_AUDIO_BUFFERING", readable = False, param_types = "i"),
     # Notification Commands - TCI Protocol 2.0 - Section 4.4
     # All these should be readable = False, writeable = False, but a few commands are mixed into this section
-    TciCommand("CLICKED_ON_SPOT",         readable = False, writeable = False, param_count = 2),
-    TciCommand("RX_CLICKED_ON_SPOT",      readable = False, writeable = False, has_rx = True, has_sub_rx = True, param_count = 2),
-    TciCommand("TX_FOOTSWITCH",           readable = False, writeable = False, has_rx = True),
-    TciCommand("TX_FREQUENCY",            readable = False, writeable = False),
-    TciCommand("APP_FOCUS",               readable = False, writeable = False),
-    TciCommand("SET_IN_FOCUS",            readable = False, param_count = 0),
-    TciCommand("KEYER",                   readable = False, writeable = False, has_rx = True),
-    TciCommand("RX_SENSORS_ENABLE",       readable = False, param_count = 2),
-    TciCommand("TX_SENSORS_ENABLE",       readable = False, param_count = 2),
-    TciCommand("RX_SENSORS",              readable = False, writeable = False, has_rx = True), # Deprecated in 2.0
-    TciCommand("TX_SENSORS",              readable = False, writeable = False, has_rx = True, param_count = 4),
+    TciCommand("CLICKED_ON_SPOT",         readable = False, writeable = False, param_count = 2, param_types = "si", stateful = False),
+    TciCommand("RX_CLICKED_ON_SPOT",      readable = False, writeable = False, has_rx = True, has_sub_rx = True, param_count = 2, param_types = "si", stateful = False),
+    TciCommand("TX_FOOTSWITCH",           readable = False, writeable = False, has_rx = True, param_types = "b", stateful = False),
+    TciCommand("TX_FREQUENCY",            readable = False, writeable = False, param_types = "i"),
+    TciCommand("APP_FOCUS",               readable = False, writeable = False, param_types = "b"),
+    TciCommand("SET_IN_FOCUS",            readable = False, param_count = 0, stateful = False),
+    TciCommand("KEYER",                   readable = False, writeable = False, has_rx = True, param_types = "b", stateful = False),
+    TciCommand("RX_SENSORS_ENABLE",       readable = False, param_count = 2, param_types = "bi"),
+    TciCommand("TX_SENSORS_ENABLE",       readable = False, param_count = 2, param_types = "bi"),
+    TciCommand("RX_SENSORS",              readable = False, writeable = False, has_rx = True, param_types = "f"), # Deprecated in 2.0
+    TciCommand("TX_SENSORS",              readable = False, writeable = False, has_rx = True, param_count = 4, param_types = "ffff"),
     # New Commands - TCI Protocol 2.0 - Section 4.5
-    TciCommand("VFO_LOCK",                readable = False, writeable = False, has_rx = True, has_sub_rx = True),
-    TciCommand("RX_CHANNEL_SENSORS",      readable = False, writeable = False, has_rx = True, has_sub_rx = True),
+    TciCommand("VFO_LOCK",                readable = False, writeable = False, has_rx = True, has_sub_rx = True, param_types = "b"),
+    TciCommand("RX_CHANNEL_SENSORS",      readable = False, writeable = False, has_rx = True, has_sub_rx = True, param_types = "f"),
     # CW Macros - TCI Protocl 2.0 - Section 3.2.1
-    TciCommand("CW_MACROS",               readable = False, has_rx = True),
-    TciCommand("CW_TERMINAL",             readable = False),
-    TciCommand("CW_MACROS_EMPTY",         readable = False, writeable = False, param_count = 0),
-    TciCommand("CW_MSG",                  readable = False, has_rx = True, param_count = 3),
-    TciCommand("CALLSIGN_SEND",           readable = False, writeable = False),
-    TciCommand("CW_MACROS_STOP",          readable = False, param_count = 0),
+    TciCommand("CW_MACROS",               readable = False, has_rx = True, param_types = "s", stateful = False),
+    TciCommand("CW_TERMINAL",             readable = False, param_types = "b"),
+    TciCommand("CW_MACROS_EMPTY",         readable = False, writeable = False, param_count = 0, stateful = False),
+    TciCommand("CW_MSG",                  readable = False, has_rx = True, param_count = 3, param_types = "sss", stateful = False),
+    TciCommand("CALLSIGN_SEND",           readable = False, writeable = False, param_types = "s", stateful = False),
+    TciCommand("CW_MACROS_STOP",          readable = False, param_count = 0, stateful = False),
     # Commands not documented in 1.9 but definitely encountered - TCI Protocol 1.6
-    TciCommand("RX_ENABLE",               has_rx = True),
-    TciCommand("CTCSS_ENABLE",            has_rx = True),
-    TciCommand("CTCSS_MODE",              has_rx = True),
-    TciCommand("CTCSS_RX_TONE",           has_rx = True),
-    TciCommand("CTCSS_TX_TONE",           has_rx = True),
-    TciCommand("CTCSS_LEVEL",             has_rx = True),
+    TciCommand("RX_ENABLE",               has_rx = True, param_types = "b"),
+    TciCommand("CTCSS_ENABLE",            has_rx = True, param_types = "b"),
+    TciCommand("CTCSS_MODE",              has_rx = True, param_types = "i"),
+    TciCommand("CTCSS_RX_TONE",           has_rx = True, param_types = "i"),
+    TciCommand("CTCSS_TX_TONE",           has_rx = True, param_types = "i"),
+    TciCommand("CTCSS_LEVEL",             has_rx = True, param_types = "i"),
     # Commands not documented in 1.9 but no similar functionality - TCI Protocol 1.6
     TciCommand("ECODER_SWITCH_RX",        has_rx = True),
     TciCommand("ECODER_SWITCH_CHANNEL",   has_rx = True),
     # Commands not documented in 1.9 but probably superseded - TCI Protocol 1.6
-    TciCommand("RX_SMETER",               writeable = False, has_rx = True, has_sub_rx = True),
-    TciCommand("TX_POWER",                writeable = False),
-    TciCommand("TX_SWR",                  writeable = False),
+    TciCommand("RX_SMETER",               writeable = False, has_rx = True, has_sub_rx = True, param_types = "f"),
+    TciCommand("TX_POWER",                writeable = False, param_types = "f"),
+    TciCommand("TX_SWR",                  writeable = False, param_types = "f"),
 ]}
 
+def split_command_string(message):
+    """Splits a single command string into its TciCommand and a list of parameter strings.
+
+    Returns (None, []) if the command is not recognized.
+    """
+    name, _, param_str = message.rstrip(";").partition(":")
+    cmd_info = COMMANDS.get(name.upper())
+    if cmd_info is None:
+        return None, []
+    return cmd_info, param_str.split(",") if param_str else []
+
+# Commands stopping the data streams, mapped to the command starting each stream.
+STREAM_STOPS = {"IQ_STOP": "IQ_START", "AUDIO_STOP": "AUDIO_START", "LINE_OUT_STOP": "LINE_OUT_START"}
+
+def command_state_key(cmd_info, fields):
+    """Returns the (name, rx, sub_rx) key of the state set or read by a command with parameter
+    strings fields, as split by split_command_string.
+    """
+    rx = fields[0] if cmd_info.has_rx and fields else None
+    sub_rx = fields[1] if cmd_info.has_rx and cmd_info.has_sub_rx and len(fields) > 1 else None
+    return (cmd_info.name, rx, sub_rx)
+
 class TciCommandSendAction(IntEnum):
     """TciCommandSendAction defines whether a parameter update is being requested (READ)
     or sent to the device (WRITE)."""
@@ -215,10 +372,66 @@ class TciSampleType(IntEnum):
     INT32 = 2
     FLOAT32 = 3
 
+    @property
+    def bytes_per_sample(self):
+        """Number of bytes used by each individual sample of this type."""
+        return _SAMPLE_SIZES[self]
+
+_SAMPLE_SIZES = {
+    TciSampleType.INT16: 2,
+    TciSampleType.INT24: 3,
+    TciSampleType.INT32: 4,
+    TciSampleType.FLOAT32: 4,
+}
+
+_SAMPLE_DTYPES = {
+    TciSampleType.INT16: "<i2",
+    TciSampleType.INT24: "<i4",
+    TciSampleType.INT32: "<i4",
+    TciSampleType.FLOAT32: "<f4",
+}
+
+_SAMPLE_SCALES = {
+    TciSampleType.INT16: 1.0 / (1 << 15),
+    TciSampleType.INT24: 1.0 / (1 << 23),
+    TciSampleType.INT32: 1.0 / (1 << 31),
+    TciSampleType.FLOAT32: 1.0,
+}
+
+def widen_int24(data, count=None):
+    """Returns count packed little-endian 24-bit samples of data, or as many as data holds, as a new
+    NumPy int32 array at full 32-bit scale, i.e. with each sample shifted left by 8 bits.  Requires NumPy.
+    """
+    import numpy as np # pylint: disable=import-outside-toplevel
+
+    if count is None:
+        count = len(data) // 3
+    widened = np.zeros((count, 4), dtype=np.uint8)
+    widened[:, 1:] = np.frombuffer(data, dtype=np.uint8, count=3*count).reshape(-1, 3)
+    return widened.view("<i4").reshape(-1)
+
+_DATA_HEADER = struct.Struct("<8I")
+_DATA_HEADER_SIZE = 8*4+8*4
+# Header and reserved padding of an outgoing data packet, packed in one call.
+_DATA_FRAME_HEADER = struct.Struct("<8I32x")
+
+@lru_cache(maxsize=32)
+def _data_frame_struct(payload_size):
+    """Returns the Struct packing an outgoing data packet with a payload of payload_size bytes."""
+    return struct.Struct(f"<8I32x{payload_size}s")
+
+# Enum members by value, looked up faster than by calling the enum.
+_SAMPLE_TYPES = {sample_type.value: sample_type for sample_type in TciSampleType}
+_STREAM_TYPES = {stream_type.value: stream_type for stream_type in TciStreamType}
+
 class TciDataPacket:
     """TciDataPacket instances are used to contain received data packets or define outgoing data packets.
+
+    Packets decoded with zero_copy enabled hold a memoryview over the received buffer as their data.
     """
 
+    __slots__ = ("rx", "sample_rate", "data_format", "codec", "crc", "length", "data_type", "channels", "data")
+
     def __init__(self, rx, sample_rate, data_format, codec, crc, length, data_type, channels, data):
         self.rx = rx
         self.sample_rate = sample_rate
@@ -230,10 +443,36 @@ class TciDataPacket:
         self.channels = channels
         self.data = data
 
+    def __reduce__(self):
+        """Pickles the packet with all header fields decoded, copying memoryview data to bytes."""
+        data = self.data
+        if isinstance(data, memoryview):
+            data = data.tobytes()
+        return (TciDataPacket, (self.rx, self.sample_rate, self.data_format, self.codec, self.crc,
+                                self.length, self.data_type, self.channels, data))
+
     @classmethod
-    def from_buf(cls, buf):
-        """Produces a TciDataPacket instance by decoding a raw recevied data buffer."""
-        vals = struct.unpack_from("<8I", buf)
+    def from_buf(cls, buf, zero_copy = False):
+        """Produces a TciDataPacket instance by decoding a raw recevied data buffer.
+
+        With zero_copy, the packet data is a memoryview into buf rather than a copy of the samples.
+        """
+        if zero_copy:
+            packet = cls.__new__(cls)
+            (packet.rx, packet.sample_rate, data_format, packet.codec, packet.crc, length, data_type,
+             packet.channels) = _DATA_HEADER.unpack_from(buf)
+            # Unknown values are passed to the enums to raise ValueError.
+            packet.data_format = (_SAMPLE_TYPES[data_format] if data_format in _SAMPLE_TYPES
+                                  else TciSampleType(data_format))
+            packet.data_type = _STREAM_TYPES[data_type] if data_type in _STREAM_TYPES else TciStreamType(data_type)
+            packet.length = length
+            if length:
+                packet.data = memoryview(buf)[_DATA_HEADER_SIZE:]
+            else:
+                packet.data = None
+            return packet
+
+        vals = _DATA_HEADER.unpack_from(buf)
         rx = vals[0]
         sample_rate = vals[1]
         data_format = TciSampleType(vals[2])
@@ -242,19 +481,123 @@ class TciDataPacket:
         length = vals[5]
         data_type = TciStreamType(vals[6])
         channels = vals[7]
-        offset = 8*4+8*4
+        offset = _DATA_HEADER_SIZE
         if length:
             data = buf[offset:]
         else:
             data = None
         return cls(rx, sample_rate, data_format, codec, crc, length, data_type, channels, data)
 
-    def to_bytes(self):
-        """Returns the raw bytes required to represent a TciDataPacket instance."""
-        if self.data_format == TciSampleType.INT16:
-            bytes_per_sample = 2
-        elif self.data_format == TciSampleType.INT24:
-            bytes_per_sample = 3
+    def samples(self):
+        """Returns the packet data as a NumPy array of shape (frames, channels).
+
+        INT16, INT32 and FLOAT32 data is returned as a read-only view of the packet data without
+        copying.  INT24 data is unpacked into a new int32 array.  Requires NumPy.
+        """
+        import numpy as np # pylint: disable=import-outside-toplevel
+
+        channels = self.channels or 1
+        data_format = self.data_format
+        if self.data is None:
+            return np.zeros((0, channels), dtype=_SAMPLE_DTYPES[data_format])
+        count = len(self.data) // data_format.bytes_per_sample
+        count -= count % channels
+
+        if data_format == TciSampleType.INT24:
+            vals = widen_int24(self.data, count) >> 8
+        else:
+            vals = np.frombuffer(self.data, dtype=_SAMPLE_DTYPES[data_format], count=count)
+
+        return vals.reshape(-1, channels)
+
+    def normalized_samples(self):
+        """Returns the packet data as float32 samples scaled to the range [-1.0, 1.0).
+
+        IQ stream packets are returned as a one-dimensional complex64 array of I + jQ values and other
+        packets as a float32 array of shape (frames, channels).  Requires NumPy.
+        """
+        import numpy as np # pylint: disable=import-outside-toplevel
+
+        vals = self.samples()
+        if self.data_format == TciSampleType.FLOAT32:
+            vals = vals.astype(np.float32, copy=False)
         else:
-            bytes_per_sample = 4
-        return struct.pack(f"<8I32x{bytes_per_sample*self.length}s", self.rx, self.sample_rate, self.data_format, self.codec, self.crc, self.length, self.data_type, self.channels, self.data)
+            vals = vals.astype(np.float32)
+            vals *= np.float32(_SAMPLE_SCALES[self.data_format])
+
+        if self.data_type == TciStreamType.IQ_STREAM and vals.shape[1] == 2:
+            return np.ascontiguousarray(vals).view(np.complex64).reshape(-1)
+        return vals
+
+    def to_bytes(self):
+        """Returns the raw bytes required to represent a TciDataPacket instance.
+
+        The data may be any object supporting the buffer protocol, such as bytes, array.array, or a
+        NumPy array.
+        """
+        payload_size = _SAMPLE_SIZES[self.data_format] * self.length
+        data = self.data
+        if data is None or isinstance(data, bytes):
+            # Struct pads short payloads with zeros to the length given in the header.
+            return _data_frame_struct(payload_size).pack(self.rx, self.sample_rate, self.data_format, self.codec,
+                                                         self.crc, self.length, self.data_type, self.channels,
+                                                         data or b"")
+        header = _DATA_FRAME_HEADER.pack(self.rx, self.sample_rate, self.data_format, self.codec, self.crc,
+                                         self.length, self.data_type, self.channels)
+        with memoryview(data) as view, view.cast("B") as payload:
+            if len(payload) >= payload_size:
+                return header + payload[:payload_size]
+            return header + payload + bytes(payload_size - len(payload))
+
+class TciPacketBuilder:
+    """TciPacketBuilder instances produce outgoing data packets, such as TX audio, into a small ring of
+    preallocated buffers using a precompiled header layout.  This avoids building a new packet object
+    and copying the sample data more than once for every packet sent.
+
+    The memoryview returned by build() remains valid until the same buffer is reused, which happens
+    after the given number of buffers further calls to build().  Packets passed to Listener.send() are
+    queued without copying, so the ring must hold more buffers than packets can be waiting to be sent;
+    Listener.packet_builder() creates builders sized for its send queue.
+    """
+
+    def __init__(self, rx, sample_rate, data_format, channels, max_samples,
+                 data_type = TciStreamType.TX_AUDIO_STREAM, codec = 0, crc = 0, buffers = 2):
+        self.rx = rx
+        self.sample_rate = sample_rate
+        self.data_format = TciSampleType(data_format)
+        self.channels = channels
+        self.max_samples = max_samples
+        self.data_type = TciStreamType(data_type)
+        self.codec = codec
+        self.crc = crc
+        self._bytes_per_sample = self.data_format.bytes_per_sample
+        size = _DATA_HEADER_SIZE + max_samples * self._bytes_per_sample
+        self._bufs = [bytearray(size) for _ in range(buffers)]
+        self._next_buf = 0
+
+    def build(self, data, length = None):
+        """Packs data into the next preallocated buffer and returns a memoryview of the complete packet.
+
+        The data may be any object supporting the buffer protocol, such as bytes, array.array, a NumPy
+        array, or a memoryview slice of one of these.  The length is the number of samples to send and
+        defaults to all whole samples contained in data.  Missing samples are sent as zeros.
+        """
+        buf = self._bufs[self._next_buf]
+        self._next_buf = (self._next_buf + 1) % len(self._bufs)
+
+        with memoryview(data) as view, view.cast("B") as payload:
+            data_size = len(payload)
+            if length is None:
+                length = data_size // self._bytes_per_sample
+            if length > self.max_samples:
+                raise ValueError(f"Packet of {length} samples exceeds builder capacity of {self.max_samples} samples.")
+            payload_size = length * self._bytes_per_sample
+            copy_size = min(data_size, payload_size)
+            end = _DATA_HEADER_SIZE + copy_size
+            buf[_DATA_HEADER_SIZE:end] = payload[:copy_size]
+
+        _DATA_HEADER.pack_into(buf, 0, self.rx, self.sample_rate, self.data_format, self.codec, self.crc,
+                               length, self.data_type, self.channels)
+        if copy_size < payload_size:
+            buf[end:_DATA_HEADER_SIZE + payload_size] = bytes(payload_size - copy_size)
+        return memoryview(buf)[:_DATA_HEADER_SIZE + payload_size]
@@ -3,10 +3,10 @@ from eesdr_tci.listener import Listener
 from eesdr_tci.tci import TciCommandSendAction, TciStreamType
 from config import Config
 from scipy.signal import ZoomFFT
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 import asyncio
 import sys
-import array
-import functools
 
 class CTCSS:
     # These are the somewhat standard number order, sourced from the Wikipedia article on CTCSS
@@ -18,10 +18,13 @@ class CTCSS:
         self._sample_size = sample_size
         self._process_buff_extra = sample_rate / process_rate
         self._zfft = ZoomFFT(n = sample_size, fn = max_freq, m = int(max_freq / freq_res) + 1, fs = sample_rate, endpoint = True)
-        self._buff = array.array('h')
+        self._buff = np.zeros(0, dtype=np.int16)
 
-    def process(self, raw_data):
-        self._buff += array.array('h', raw_data)
+    def reset(self):
+        self._buff = np.zeros(0, dtype=np.int16)
+
+    def process(self, samples):
+        self._buff = np.concatenate((self._buff, samples))
         if len(self._buff) < self._sample_size + self._process_buff_extra:
             return None
         self._buff = self._buff[-self._sample_size:]
@@ -37,25 +40,24 @@ class CTCSS:
 
         return None
 
-tci_listener = None
-sr_verified = None
-sch_verified = None
-sst_verified = None
-
-async def verify_response(command, rx, subrx, param):
-    if command == "AUDIO_SAMPLERATE":
-        assert(param == sample_rate)
-        sr_verified.set()
-    elif command == "AUDIO_STREAM_CHANNELS":
-        assert(param == 1)
-        sch_verified.set()
-    elif command == "AUDIO_STREAM_SAMPLE_TYPE":
-        assert(param == "int16")
-        sst_verified.set()
-
-async def receive_data(ctcss, packet):
-    peaks = ctcss.process(packet.data)
-
+class CtcssReceiver:
+    # Runs in the executor thread, keeping the FFT off the event loop.  Packets dropped while the
+    # thread is busy would leave a gap in the sample buffer, so it is restarted after each drop.
+    def __init__(self, ctcss):
+        self.ctcss = ctcss
+        self.offloaded = None
+        self.resets = 0
+        self._dropped = 0
+
+    def __call__(self, packet):
+        dropped = self.offloaded.dropped
+        if dropped != self._dropped:
+            self._dropped = dropped
+            self.resets += 1
+            self.ctcss.reset()
+        return self.ctcss.process(packet.samples()[:, 0])
+
+def print_peaks(peaks):
     if peaks is None:
         return
     for (f, m) in peaks:
@@ -67,33 +69,31 @@ async def receive_data(ctcss, packet):
         print(f"PL {f:.1f} Hz [idx {i}] (Conf {m:.2f} {conf_desc})")
 
 async def audio_receiver(uri, sample_rate, ctcss_process_rate):
-    global tci_listener, sr_verified, sch_verified, sst_verified
-
     tci_listener = Listener(uri)
-    sr_verified = asyncio.Event()
-    sch_verified = asyncio.Event()
-    sst_verified = asyncio.Event()
 
     await tci_listener.start()
     await tci_listener.ready()
 
-    tci_listener.add_param_listener("AUDIO_SAMPLERATE", verify_response)
-    tci_listener.add_param_listener("AUDIO_STREAM_CHANNELS", verify_response)
-    tci_listener.add_param_listener("AUDIO_STREAM_SAMPLE_TYPE", verify_response)
-
-    await tci_listener.send(tci.COMMANDS["AUDIO_SAMPLERATE"].prepare_string(TciCommandSendAction.WRITE, params=[sample_rate]))
-    await tci_listener.send(tci.COMMANDS["AUDIO_STREAM_CHANNELS"].prepare_string(TciCommandSendAction.WRITE, params=[1]))
-    await tci_listener.send(tci.COMMANDS["AUDIO_STREAM_SAMPLE_TYPE"].prepare_string(TciCommandSendAction.WRITE, params=["int16"]))
-
-    await sr_verified.wait()
-    await sst_verified.wait()
-
-    ctcss = CTCSS(sample_rate, 300, 0.1, sample_rate, ctcss_process_rate)
-    tci_listener.add_data_listener(TciStreamType.RX_AUDIO_STREAM, functools.partial(receive_data, ctcss))
-
-    await tci_listener.send(tci.COMMANDS["AUDIO_START"].prepare_string(TciCommandSendAction.WRITE, rx=0))
-
-    await tci_listener.wait()
+    verified = await tci_listener.set_many({
+        "AUDIO_SAMPLERATE": sample_rate,
+        "AUDIO_STREAM_CHANNELS": 1,
+        "AUDIO_STREAM_SAMPLE_TYPE": "int16",
+    })
+    assert(verified["AUDIO_SAMPLERATE"] == sample_rate)
+    assert(verified["AUDIO_STREAM_CHANNELS"] == 1)
+    assert(verified["AUDIO_STREAM_SAMPLE_TYPE"] == "int16")
+
+    receiver = CtcssReceiver(CTCSS(sample_rate, 300, 0.1, sample_rate, ctcss_process_rate))
+    # A single worker thread keeps the CTCSS sample buffer updated in order
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        receiver.offloaded = tci_listener.add_data_listener(TciStreamType.RX_AUDIO_STREAM, receiver, executor=executor,
+                                                            max_inflight=16, on_result=print_peaks)
+        try:
+            await tci_listener.send(tci.COMMANDS["AUDIO_START"].prepare_string(TciCommandSendAction.WRITE, rx=0))
+            await tci_listener.wait()
+        finally:
+            tci_listener.remove_data_listener(TciStreamType.RX_AUDIO_STREAM, receiver)
+            print(f"{receiver.offloaded.dropped} packets dropped, sample buffer restarted {receiver.resets} times")
 
 cfg = Config("example_config.json")
 uri = cfg.get("uri", required=True)
@@ -1,6 +1,6 @@
 from eesdr_tci import tci
 from eesdr_tci.listener import Listener
-from eesdr_tci.tci import TciStreamType, TciSampleType, TciDataPacket, TciCommandSendAction
+from eesdr_tci.tci import TciStreamType, TciSampleType, TciCommandSendAction
 from config import Config
 import asyncio
 import sys
@@ -21,6 +21,7 @@ async def transmit_receiver(stdout_stream, tx_data_received, tx_data_queue):
 
 async def transmit_sender(tx_data_received, tx_data_queue, tx_chrono_queue):
     tx_buf = array.array('h')
+    tx_packets = tci_listener.packet_builder(0, 24000, TciSampleType.INT16, 1, SAMPLE_BUFSIZE)
     while True:
         await tx_data_received.wait()
         await tci_listener.send(tci.COMMANDS["TRX"].prepare_string(TciCommandSendAction.WRITE, rx=0, params=["true", "tci"], check_params=False))
@@ -30,7 +31,6 @@ async def transmit_sender(tx_data_received, tx_data_queue, tx_chrono_queue):
             except asyncio.exceptions.TimeoutError:
                 print("Unexpected no chrono packet")
                 break
-            packet = TciDataPacket(0, 24000, TciSampleType.INT16, 0, 0, SAMPLE_BUFSIZE, TciStreamType.TX_AUDIO_STREAM, 1, None)
             buf_avail = SAMPLE_BUFSIZE
             while len(tx_buf) < SAMPLE_BUFSIZE:
                 try:
@@ -39,13 +39,12 @@ async def transmit_sender(tx_data_received, tx_data_queue, tx_chrono_queue):
                 except asyncio.exceptions.TimeoutError:
                     buf_avail = len(tx_buf)
                     break
-            packet.length = buf_avail
-            packet.data = tx_buf[0:buf_avail].tobytes()
+            packet = tx_packets.build(memoryview(tx_buf)[0:buf_avail])
             if len(tx_buf) > buf_avail:
                 tx_buf = tx_buf[buf_avail:]
             else:
                 tx_buf = array.array('h')
-            await tci_listener.send(packet.to_bytes())
+            await tci_listener.send(packet)
             await asyncio.sleep(0)
             if buf_avail < SAMPLE_BUFSIZE:
                 break
@@ -55,63 +54,31 @@ async def transmit_sender(tx_data_received, tx_data_queue, tx_chrono_queue):
         tx_data_received.clear()
 
 tci_listener = None
-rate_verified = None
-chans_verified = None
-type_verified = None
-samples_verified = None
-
-async def verify_response(name, rx, subrx, params):
-    if name == "AUDIO_SAMPLERATE":
-        assert(params == sample_rate)
-        rate_verified.set()
-        tci_listener.remove_param_listener(name, verify_response)
-    elif name == "AUDIO_STREAM_CHANNELS":
-        assert(params == 1)
-        chans_verified.set()
-        tci_listener.remove_param_listener(name, verify_response)
-    elif name == "AUDIO_STREAM_SAMPLE_TYPE":
-        assert(params == "int16")
-        type_verified.set()
-        tci_listener.remove_param_listener(name, verify_response)
-    elif name == "AUDIO_STREAM_SAMPLES":
-        assert(params == SAMPLE_BUFSIZE)
-        samples_verified.set()
-        tci_listener.remove_param_listener(name, verify_response)
 
 async def show_ptt(name, rx, subrx, params):
     print(f"PTT {rx} {'On' if params else 'Off'}")
 
 async def handle_rx_audio(stdin_stream, packet):
-    data = array.array('h', packet.data)
-    stdin_stream.write(data.tobytes())
+    stdin_stream.write(packet.data)
     await stdin_stream.drain()
 
 async def audio_receiver(uri, sample_rate):
-    global tci_listener, rate_verified, chans_verified, type_verified, samples_verified
+    global tci_listener
 
     tci_listener = Listener(uri)
     await tci_listener.start()
     await tci_listener.ready()
 
-    rate_verified = asyncio.Event()
-    chans_verified = asyncio.Event()
-    type_verified = asyncio.Event()
-    samples_verified = asyncio.Event()
-
-    tci_listener.add_param_listener("AUDIO_SAMPLERATE", verify_response)
-    tci_listener.add_param_listener("AUDIO_STREAM_CHANNELS", verify_response)
-    tci_listener.add_param_listener("AUDIO_STREAM_SAMPLE_TYPE", verify_response)
-    tci_listener.add_param_listener("AUDIO_STREAM_SAMPLES", verify_response)
-
-    await tci_listener.send(tci.COMMANDS["AUDIO_SAMPLERATE"].prepare_string(TciCommandSendAction.WRITE, params=[sample_rate]))
-    await tci_listener.send(tci.COMMANDS["AUDIO_STREAM_CHANNELS"].prepare_string(TciCommandSendAction.WRITE, params=[1]))
-    await tci_listener.send(tci.COMMANDS["AUDIO_STREAM_SAMPLE_TYPE"].prepare_string(TciCommandSendAction.WRITE, params=["int16"]))
-    await tci_listener.send(tci.COMMANDS["AUDIO_STREAM_SAMPLES"].prepare_string(TciCommandSendAction.WRITE, params=[SAMPLE_BUFSIZE]))
-
-    await rate_verified.wait()
-    await chans_verified.wait()
-    await type_verified.wait()
-    await samples_verified.wait()
+    verified = await tci_listener.set_many({
+        "AUDIO_SAMPLERATE": sample_rate,
+        "AUDIO_STREAM_CHANNELS": 1,
+        "AUDIO_STREAM_SAMPLE_TYPE": "int16",
+        "AUDIO_STREAM_SAMPLES": SAMPLE_BUFSIZE,
+    })
+    assert(verified["AUDIO_SAMPLERATE"] == sample_rate)
+    assert(verified["AUDIO_STREAM_CHANNELS"] == 1)
+    assert(verified["AUDIO_STREAM_SAMPLE_TYPE"] == "int16")
+    assert(verified["AUDIO_STREAM_SAMPLES"] == SAMPLE_BUFSIZE)
 
     dw_proc = await asyncio.create_subprocess_exec("./direwolf-stdout", "-O", stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
     printer_task = asyncio.create_task(data_printer(dw_proc.stderr))
@@ -0,0 +1,37 @@
+# Archives the IQ stream of a receiver as a SigMF recording (capture.sigmf-data and
+# capture.sigmf-meta) until interrupted, with tuning changes recorded in the metadata.
+
+from eesdr_tci import tci
+from eesdr_tci.listener import Listener
+from eesdr_tci.sigmf import attach_iq_capture
+from eesdr_tci.tci import TciCommandSendAction
+from config import Config
+import asyncio
+
+async def capture_iq(uri, rx, sample_rate, path):
+    tci_listener = Listener(uri, zero_copy=True, track_state=True)
+
+    await tci_listener.start()
+    await tci_listener.ready()
+
+    await tci_listener.set("IQ_SAMPLERATE", sample_rate)
+
+    capture = attach_iq_capture(tci_listener, path, rx=rx, description="eesdr-tci IQ capture")
+
+    await tci_listener.send(tci.COMMANDS["IQ_START"].prepare_string(TciCommandSendAction.WRITE, rx=rx))
+
+    try:
+        await tci_listener.wait()
+    finally:
+        capture.close()
+        print(f"Wrote {capture.received} packets to {', '.join(capture.recordings)}")
+
+cfg = Config("example_config.json")
+uri = cfg.get("uri", required=True)
+rx = cfg.get("rx", default=0)
+sample_rate = cfg.get("iq_sample_rate", default=192000)
+path = cfg.get("capture_path", default="capture")
+
+print(f"Connecting to {uri}")
+
+asyncio.run(capture_iq(uri, rx, sample_rate, path))
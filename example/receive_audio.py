@@ -8,41 +8,22 @@ from eesdr_tci.tci import TciSampleType, TciCommandSendAction, TciStreamType
 from config import Config
 import asyncio
 import sys
-import array
-
-tci_listener = None
-sr_verified = None
-sst_verified = None
-
-async def verify_response(command, rx, subrx, param):
-    if command == "AUDIO_SAMPLERATE":
-        assert(param == sample_rate)
-        sr_verified.set()
-    elif command == "AUDIO_STREAM_SAMPLE_TYPE":
-        assert(param == sample_fmt.name.lower())
-        sst_verified.set()
 
 async def receive_data(packet):
     sys.stdout.buffer.write(packet.data)
 
 async def audio_receiver(uri, sample_rate, sample_fmt):
-    global tci_listener, sr_verified, sst_verified
-
     tci_listener = Listener(uri)
-    sr_verified = asyncio.Event()
-    sst_verified = asyncio.Event()
 
     await tci_listener.start()
     await tci_listener.ready()
 
-    tci_listener.add_param_listener("AUDIO_SAMPLERATE", verify_response)
-    tci_listener.add_param_listener("AUDIO_STREAM_SAMPLE_TYPE", verify_response)
-
-    await tci_listener.send(tci.COMMANDS["AUDIO_SAMPLERATE"].prepare_string(TciCommandSendAction.WRITE, params=[sample_rate]))
-    await tci_listener.send(tci.COMMANDS["AUDIO_STREAM_SAMPLE_TYPE"].prepare_string(TciCommandSendAction.WRITE, params=[sample_fmt.name.lower()]))
-
-    await sr_verified.wait()
-    await sst_verified.wait()
+    verified = await tci_listener.set_many({
+        "AUDIO_SAMPLERATE": sample_rate,
+        "AUDIO_STREAM_SAMPLE_TYPE": sample_fmt.name.lower(),
+    })
+    assert(verified["AUDIO_SAMPLERATE"] == sample_rate)
+    assert(verified["AUDIO_STREAM_SAMPLE_TYPE"] == sample_fmt.name.lower())
 
     tci_listener.add_data_listener(TciStreamType.RX_AUDIO_STREAM, receive_data)
 
@@ -0,0 +1,43 @@
+# Records the audio of a receiver to WAV files, starting a new file every rotate_minutes minutes.
+# Unlike receive_audio.py, samples are written from a background thread, so a slow disk never
+# stalls the connection to the radio.
+
+from eesdr_tci import tci
+from eesdr_tci.listener import Listener
+from eesdr_tci.recorder import attach_audio_recorder
+from eesdr_tci.tci import TciSampleType, TciCommandSendAction
+from config import Config
+import asyncio
+
+async def record_audio(uri, rx, sample_rate, sample_fmt, rotate_minutes):
+    tci_listener = Listener(uri, zero_copy=True)
+
+    await tci_listener.start()
+    await tci_listener.ready()
+
+    await tci_listener.set_many({
+        "AUDIO_SAMPLERATE": sample_rate,
+        "AUDIO_STREAM_SAMPLE_TYPE": sample_fmt.name.lower(),
+    })
+
+    recorder = attach_audio_recorder(tci_listener, f"rx{{rx}}_{{time}}.wav", rx=rx, rotate_seconds=60 * rotate_minutes)
+
+    await tci_listener.send(tci.COMMANDS["AUDIO_START"].prepare_string(TciCommandSendAction.WRITE, rx=rx))
+
+    try:
+        await tci_listener.wait()
+    finally:
+        recorder.close()
+        print(f"Wrote {recorder.bytes_written} bytes to {len(recorder.files)} files, dropped {recorder.dropped} packets.")
+
+cfg = Config("example_config.json")
+uri = cfg.get("uri", required=True)
+rx = cfg.get("rx", default=0)
+sample_rate = cfg.get("sample_rate", default=48000)
+sample_fmt = TciSampleType(cfg.get("sample_format", default=TciSampleType.INT16.value))
+rotate_minutes = cfg.get("rotate_minutes", default=60)
+
+print(f"Connecting to {uri}")
+print(f"Recording receiver {rx} at sample rate {sample_rate}, and sample_format {sample_fmt.name}.")
+
+asyncio.run(record_audio(uri, rx, sample_rate, sample_fmt, rotate_minutes))
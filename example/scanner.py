@@ -9,28 +9,7 @@ from datetime import datetime
 
 stations = None
 
-squelch_level = 0
-if_limits = []
-rx_dds = 0
-filter_band = []
-
-async def update_params(name, rx, subrx, params):
-    global squelch_level, if_limits, rx_dds, filter_band
-
-    if rx is not None and rx != 0:
-        return
-
-    if name == "SQL_LEVEL":
-        squelch_level = params
-    elif name == "IF_LIMITS":
-        if_limits = params
-    elif name == "DDS":
-        rx_dds = params
-    elif name == "RX_FILTER_BAND":
-        filter_band = params
-
 async def next_frequency(tci_listener, next_station_event, monitor_station_event):
-    global if_limits, rx_dds, filter_band
     global stations
 
     stations_idx = 0
@@ -38,6 +17,10 @@ async def next_frequency(tci_listener, next_station_event, monitor_station_event
     while True:
         await next_station_event.wait()
 
+        if_limits = tci_listener.state.get("IF_LIMITS")
+        rx_dds = tci_listener.state.get("DDS", rx=0)
+        filter_band = tci_listener.state.get("RX_FILTER_BAND", rx=0)
+
         station = stations[stations_idx]
         stations_idx += 1
         if stations_idx >= len(stations):
@@ -61,19 +44,15 @@ async def next_frequency(tci_listener, next_station_event, monitor_station_event
         monitor_station_event.set()
 
 async def rx_sensors(readings_queue, name, rx, subrx, params):
-    if rx != 0:
-        return
-
     await readings_queue.put(params)
 
 async def monitor_station(tci_listener, next_station_event, monitor_station_event, wait_time=1.0, hold_time=3.0):
-    global squelch_level
-
     while True:
         await monitor_station_event.wait()
+        squelch_level = tci_listener.state.get("SQL_LEVEL", rx=0)
         readings_queue = asyncio.Queue()
         partial = functools.partial(rx_sensors, readings_queue)
-        tci_listener.add_param_listener("RX_SENSORS", partial)
+        tci_listener.add_param_listener("RX_SENSORS", partial, rx=0)
 
         hold = False
         for i in range(int(wait_time/0.2)):
@@ -93,7 +72,7 @@ async def monitor_station(tci_listener, next_station_event, monitor_station_even
                     i += 1
 
         print(f"{str(datetime.now()).ljust(30)} No activity detected")        
-        tci_listener.remove_param_listener("RX_SENSORS", partial)
+        tci_listener.remove_param_listener("RX_SENSORS", partial, rx=0)
         
         monitor_station_event.clear()
         next_station_event.set()
@@ -103,12 +82,7 @@ async def main(uri, wait_time, hold_time):
     monitor_station_event = asyncio.Event()
     readings_queue = asyncio.Queue()
 
-    tci_listener = Listener(uri)
-
-    tci_listener.add_param_listener("SQL_LEVEL", update_params)
-    tci_listener.add_param_listener("IF_LIMITS", update_params)
-    tci_listener.add_param_listener("DDS", update_params)
-    tci_listener.add_param_listener("RX_FILTER_BAND", update_params)
+    tci_listener = Listener(uri, track_state=True, coalesce=True)
 
     await tci_listener.start()
     await tci_listener.ready()
@@ -0,0 +1,23 @@
+# Shares one connection to the radio between several TCI clients.  Point each client at
+# ws://localhost:<proxy_port> instead of the radio.
+
+from eesdr_tci.proxy import TciProxy
+from config import Config
+import asyncio
+
+async def run_proxy(uri, proxy_host, proxy_port):
+    proxy = TciProxy(uri, host=proxy_host, port=proxy_port, reconnect=True)
+
+    await proxy.start()
+    print(f"Serving TCI clients on ws://{proxy_host}:{proxy_port}")
+
+    await proxy.wait()
+
+cfg = Config("example_config.json")
+uri = cfg.get("uri", required=True)
+proxy_host = cfg.get("proxy_host", default="127.0.0.1")
+proxy_port = cfg.get("proxy_port", default=50002)
+
+print(f"Connecting to {uri}")
+
+asyncio.run(run_proxy(uri, proxy_host, proxy_port))